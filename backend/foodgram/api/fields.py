@@ -0,0 +1,100 @@
+import re
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
+from rest_framework import serializers
+
+from recipes.images import ImageProcessingError, check_image, decode_image
+
+DATA_URI = re.compile(r'^data:image/(jpeg|jpg|png|gif|webp);base64,')
+
+
+class Base64ImageStringField(serializers.CharField):
+    """
+    Картинка в base64: раскодированный файл. Здесь проверяются
+    префикс, размер, сам base64 и заголовок картинки,
+    уменьшение и пересохранение идут в фоне.
+    """
+    default_error_messages = {
+        'invalid_image': (
+            'Картинка должна быть в формате data:image/...;base64.'
+        ),
+        'invalid_base64': 'Некорректный base64.',
+        'too_large': 'Картинка больше {max_size} байт.',
+    }
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('trim_whitespace', False)
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        data = super().to_internal_value(data)
+        match = DATA_URI.match(data)
+        if not match:
+            self.fail('invalid_image')
+        if len(data) * 3 // 4 > settings.IMAGE_MAX_UPLOAD_SIZE:
+            self.fail('too_large', max_size=settings.IMAGE_MAX_UPLOAD_SIZE)
+        try:
+            raw = decode_image(data)
+        except ImageProcessingError:
+            self.fail('invalid_base64')
+        image = ContentFile(raw, name=f'image.{match.group(1)}')
+        self.check_header(image)
+        return image
+
+    def check_header(self, image):
+        try:
+            check_image(image)
+        except ImageProcessingError:
+            self.fail('invalid_image')
+
+
+class ImageRenditionField(serializers.ReadOnlyField):
+    """
+    Ссылка на нужный размер картинки рецепта: заданный явно или
+    из image_rendition в контексте. Если его нет, то на полный размер,
+    а пока размеры не готовы — на исходную картинку.
+    """
+
+    def __init__(self, rendition=None, **kwargs):
+        self.rendition = rendition
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        rendition = self.rendition or self.context.get(
+            'image_rendition', 'image'
+        )
+        image = (
+            getattr(recipe, rendition) or recipe.image or recipe.image_source
+        )
+        if not image:
+            return None
+        request = self.context.get('request')
+        if request is None:
+            return image.url
+        return request.build_absolute_uri(image.url)
+
+
+class RecipeImageField(Base64ImageStringField):
+    """
+    Картинка рецепта: строка base64 или файл из multipart/form-data.
+    Файл к этому моменту уже записан обработчиками загрузки Django.
+    """
+    default_error_messages = {
+        'invalid_file': 'Загрузите файл картинки.',
+        'invalid_image': (
+            'Загрузите картинку: файл или строку data:image/...;base64.'
+        ),
+    }
+
+    def to_internal_value(self, data):
+        if not isinstance(data, UploadedFile):
+            return super().to_internal_value(data)
+        if not (data.content_type or '').startswith('image/'):
+            self.fail('invalid_file')
+        if data.size > settings.IMAGE_MAX_UPLOAD_SIZE:
+            self.fail('too_large', max_size=settings.IMAGE_MAX_UPLOAD_SIZE)
+        self.check_header(data)
+        return data
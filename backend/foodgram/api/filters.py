@@ -1,19 +1,28 @@
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import (
+    BooleanField,
+    Exists,
+    ExpressionWrapper,
+    OuterRef,
+    Q
+)
+from django.db.models.functions import Lower
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe, Tag
-from users.models import User
+from recipes.catalog import tag_map
+from recipes.models import Ingredient, Recipe, RecipeTag
+from recipes.search import search_recipes
 
 
 class RecipeFilter(filters.FilterSet):
     """Фильтр для рецептов."""
-    author = filters.ModelChoiceFilter(
-        field_name='author_id',
-        queryset=User.objects.all()
+    author = filters.NumberFilter(
+        field_name='author_id'
     )
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
+    tags = filters.MultipleChoiceFilter(
+        choices=lambda: [(slug, slug) for slug in tag_map()],
+        method='filter_tags'
     )
 
     is_favorited = filters.BooleanFilter(
@@ -24,6 +33,21 @@ class RecipeFilter(filters.FilterSet):
         method='filter_is_in_shopping_cart'
     )
 
+    search = filters.CharFilter(
+        method='filter_search'
+    )
+
+    def filter_tags(self, queryset, name, value):
+        tags = tag_map()
+        return queryset.filter(
+            Exists(
+                RecipeTag.objects.filter(
+                    recipe=OuterRef('pk'),
+                    tag_id__in=[tags[slug] for slug in value]
+                )
+            )
+        )
+
     def filter_is_favorited(self, queryset, name, value):
         if not value:
             return queryset
@@ -34,6 +58,9 @@ class RecipeFilter(filters.FilterSet):
             return queryset
         return queryset.filter(recipe_in_cart__user=self.request.user)
 
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
     class Meta:
         model = Recipe
         fields = (
@@ -41,16 +68,59 @@ class RecipeFilter(filters.FilterSet):
             'tags',
             'is_favorited',
             'is_in_shopping_cart',
+            'search',
         )
 
 
+def ingredient_search_limit(query_params) -> int:
+    """Ограничение выдачи поиска ингредиентов из параметра limit."""
+    try:
+        limit = int(query_params.get('limit', 0))
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        return settings.INGREDIENT_SEARCH_LIMIT
+    return min(limit, settings.INGREDIENT_SEARCH_MAX_LIMIT)
+
+
 class IngredientFilter(filters.FilterSet):
-    """Фильтр для ингредиентов."""
+    """
+    Фильтр для ингредиентов.
+    Поиск по началу названия, с INGREDIENT_TRIGRAM_SEARCH ещё и
+    по подстроке и похожести. Совпадения по началу идут первыми,
+    выдача ограничена параметром limit.
+    """
     name = filters.CharFilter(
-        field_name='name',
-        lookup_expr='istartswith'
+        method='filter_name'
     )
 
+    def filter_name(self, queryset, name, value):
+        value = value.lower()
+        queryset = queryset.annotate(name_lower=Lower('name'))
+        is_prefix = Q(name_lower__startswith=value)
+        if not settings.INGREDIENT_TRIGRAM_SEARCH:
+            return queryset.filter(is_prefix).order_by(
+                'name'
+            )[:self.get_limit()]
+        return queryset.filter(
+            is_prefix
+            | Q(name_lower__contains=value)
+            | Q(name_lower__trigram_similar=value)
+        ).annotate(
+            is_prefix=ExpressionWrapper(
+                is_prefix,
+                output_field=BooleanField()
+            ),
+            similarity=TrigramSimilarity('name_lower', value)
+        ).order_by(
+            '-is_prefix',
+            '-similarity',
+            'name'
+        )[:self.get_limit()]
+
+    def get_limit(self):
+        return ingredient_search_limit(self.request.query_params)
+
     class Meta:
         model = Ingredient
         fields = ('name',)
@@ -1,22 +1,293 @@
+import csv
+import hashlib
+import json
+import time
 from collections import OrderedDict
+from datetime import datetime, timezone
 
-from django.db.models import Sum
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import (
+    Count,
+    F,
+    FloatField,
+    Prefetch,
+    Q,
+    Sum,
+    Window
+)
+from django.db.models.functions import Cast, RowNumber
 
-from recipes.models import Ingredient, IngredientAmount, Recipe
+from recipes.models import (
+    Cart,
+    FeedItem,
+    Ingredient,
+    IngredientAmount,
+    Recipe,
+    RecipeTag
+)
+from recipes.versions import (
+    INGREDIENT_VERSION_KEY,
+    TAG_VERSION_KEY,
+    table_version
+)
+from users.models import Follow
 
 
-def ingredients_extract(request) -> list:
-    """Функция для 'распаковки' ингредиентов и их кол-ва."""
-    ingredients = Ingredient.objects.filter(
-        ingredientamount__recipe__recipe_in_cart__user=request.user
-    ).annotate(amount=Sum('ingredientamount__amount'))
-    lines = []
+FEED_BATCH_SIZE = 1000
+RECOMMENDATIONS_LIMIT = 10
+RECIPES_LIMIT = 5
+RECIPES_LIMIT_MAX = 50
+# Поля рецепта для ShortenRecipeSerializer.
+SHORT_RECIPE_FIELDS = (
+    'id', 'name', 'image', 'image_thumbnail', 'image_source', 'cooking_time'
+)
+SHOPPING_CART_CHUNK_SIZE = 500
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60 * 24
+SHOPPING_CART_KEY = 'shopping_cart:{0}:{1}'
+SHOPPING_CART_VERSION_KEY = 'shopping_cart_version:{0}'
+
+
+class Echo:
+    """Псевдо-буфер для потоковой записи csv."""
+    def write(self, value):
+        return value
+
+
+def shopping_cart_version(user_id: int) -> int:
+    """Текущая версия корзины пользователя."""
+    return cache.get_or_set(
+        SHOPPING_CART_VERSION_KEY.format(user_id),
+        time.time_ns,
+        None
+    )
+
+
+def bump_shopping_cart_version(*user_ids: int) -> None:
+    """
+    Сменить версию корзины, после чего закэшированный
+    список покупок пользователя больше не используется.
+    """
+    for user_id in user_ids:
+        try:
+            cache.incr(SHOPPING_CART_VERSION_KEY.format(user_id))
+        except ValueError:
+            # Версии нет в кэше: при чтении будет создана новая.
+            pass
+
+
+def bump_recipe_shopping_carts(recipe: Recipe) -> None:
+    """Сменить версию корзин всех, у кого рецепт в корзине."""
+    bump_shopping_cart_version(
+        *Cart.objects.filter(recipe=recipe).values_list('user_id', flat=True)
+    )
+
+
+def cache_while_streaming(key: str, rows):
+    """Отдать строки по мере чтения и закэшировать их в конце."""
+    collected = []
+    for row in rows:
+        collected.append(row)
+        yield row
+    cache.set(key, collected, SHOPPING_CART_CACHE_TIMEOUT)
+
+
+def shopping_cart_ingredients(user):
+    """
+    Ингредиенты из корзины пользователя с суммарным кол-вом.
+    Читаются курсором порциями, без загрузки всего списка в память,
+    повторные запросы той же версии корзины отдаются из кэша.
+    """
+    key = SHOPPING_CART_KEY.format(user.id, shopping_cart_version(user.id))
+    cached = cache.get(key)
+    if cached is not None:
+        return iter(cached)
+    return cache_while_streaming(
+        key,
+        Ingredient.objects.filter(
+            ingredientamount__recipe__recipe_in_cart__user=user
+        ).values(
+            'name',
+            'measurement_unit'
+        ).annotate(
+            amount=Sum('ingredientamount__amount')
+        ).order_by('name').iterator(chunk_size=SHOPPING_CART_CHUNK_SIZE)
+    )
+
+
+def shopping_cart_txt(ingredients):
+    """Список покупок построчно в текстовом виде."""
     for ingredient in ingredients:
-        lines.append(
-            f'{ingredient.name}: {ingredient.amount}'
-            f'{ingredient.measurement_unit} \n'
+        yield (
+            f'{ingredient["name"]}: {ingredient["amount"]}'
+            f'{ingredient["measurement_unit"]} \n'
+        )
+
+
+def shopping_cart_csv(ingredients):
+    """Список покупок построчно в формате csv."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Ингредиент', 'Кол-во', 'Единицы измерения'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['name'],
+            ingredient['amount'],
+            ingredient['measurement_unit']
+        ))
+
+
+def shopping_cart_json(ingredients):
+    """Список покупок в виде json-массива, по одному элементу."""
+    yield '['
+    separator = ''
+    for ingredient in ingredients:
+        yield separator + json.dumps(ingredient, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+SHOPPING_CART_EXPORTS = {
+    'txt': (shopping_cart_txt, 'text/plain; charset=UTF-8'),
+    'csv': (shopping_cart_csv, 'text/csv; charset=UTF-8'),
+    'json': (shopping_cart_json, 'application/json; charset=UTF-8'),
+}
+
+
+def version_last_modified(key: str) -> datetime:
+    """Время последнего изменения таблицы по её версии."""
+    return datetime.fromtimestamp(table_version(key) / 1e9, tz=timezone.utc)
+
+
+def tags_etag(request, *args, **kwargs) -> str:
+    return str(table_version(TAG_VERSION_KEY))
+
+
+def tags_last_modified(request, *args, **kwargs) -> datetime:
+    return version_last_modified(TAG_VERSION_KEY)
+
+
+def ingredients_etag(request, *args, **kwargs) -> str:
+    return str(table_version(INGREDIENT_VERSION_KEY))
+
+
+def ingredients_last_modified(request, *args, **kwargs) -> datetime:
+    return version_last_modified(INGREDIENT_VERSION_KEY)
+
+
+def recipe_etag(request, pk=None, *args, **kwargs):
+    """
+    ETag рецепта: дата изменения, картинки и их статус, счётчик
+    избранного, данные автора, флаги пользователя и версии тэгов
+    и ингредиентов. Считается одним запросом, без сериализации рецепта.
+    """
+    recipe = Recipe.objects.with_user_flags(request.user).filter(
+        pk=pk
+    ).values_list(
+        'pub_date',
+        'image',
+        'image_card',
+        'image_thumbnail',
+        'image_status',
+        'favorites_count',
+        'is_favorited',
+        'is_in_shopping_cart',
+        'author_is_subscribed',
+        'author__email',
+        'author__username',
+        'author__first_name',
+        'author__last_name'
+    ).first()
+    if recipe is None:
+        return None
+    return hashlib.md5(
+        repr((
+            recipe,
+            request.user.id,
+            table_version(TAG_VERSION_KEY),
+            table_version(INGREDIENT_VERSION_KEY)
+        )).encode()
+    ).hexdigest()
+
+
+def get_recipes_limit(request) -> int:
+    """Сколько рецептов автора показывать в подписках."""
+    try:
+        limit = int(request.GET.get('recipes_limit', RECIPES_LIMIT))
+    except ValueError:
+        limit = RECIPES_LIMIT
+    return max(0, min(limit, RECIPES_LIMIT_MAX))
+
+
+def get_recommendations_limit(request) -> int:
+    """Сколько похожих или рекомендованных рецептов показывать."""
+    try:
+        limit = int(request.GET.get('limit', RECOMMENDATIONS_LIMIT))
+    except ValueError:
+        limit = RECOMMENDATIONS_LIMIT
+    return max(1, min(limit, settings.RECOMMENDATION_NEIGHBOURS))
+
+
+def with_recipes_preview(authors, recipes_limit: int):
+    """
+    Авторы с первыми recipes_limit рецептами,
+    выбранными одним оконным запросом на всех авторов.
+    """
+    recipes_preview = Recipe.objects.annotate(
+        row_number=Window(
+            RowNumber(),
+            partition_by=F('author_id'),
+            order_by=F('pub_date').desc()
+        )
+    ).filter(row_number__lte=recipes_limit)
+    return authors.prefetch_related(
+        Prefetch(
+            'recipes',
+            queryset=recipes_preview,
+            to_attr='recipes_preview'
         )
-    return lines
+    )
+
+
+def fan_out_recipe(recipe: Recipe) -> None:
+    """Добавить новый рецепт в ленты подписчиков автора."""
+    if not settings.FEED_FANOUT:
+        return
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(user_id=user_id, recipe=recipe)
+            for user_id in Follow.objects.filter(
+                author_id=recipe.author_id
+            ).values_list('user_id', flat=True).iterator()
+        ),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fill_feed(user_id: int, author_id: int) -> None:
+    """Добавить рецепты автора в ленту нового подписчика."""
+    if not settings.FEED_FANOUT:
+        return
+    FeedItem.objects.bulk_create(
+        (
+            FeedItem(user_id=user_id, recipe_id=recipe_id)
+            for recipe_id in Recipe.objects.filter(
+                author_id=author_id
+            ).values_list('id', flat=True).iterator()
+        ),
+        batch_size=FEED_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def clear_feed(user_id: int, author_id: int) -> None:
+    """Убрать рецепты автора из ленты отписавшегося."""
+    if not settings.FEED_FANOUT:
+        return
+    FeedItem.objects.filter(
+        user_id=user_id,
+        recipe__author_id=author_id
+    ).delete()
 
 
 def create_ingredients_connections(
@@ -37,3 +308,94 @@ def create_ingredients_connections(
             )
         )
     IngredientAmount.objects.bulk_create(ingredients_list)
+
+
+def update_ingredients_connections(
+        recipe: Recipe,
+        ingredients_data: OrderedDict
+) -> bool:
+    """
+    Привести ингредиенты рецепта к ingredients_data: добавить новые,
+    поменять кол-во у изменившихся и удалить лишние одним запросом.
+    Вернёт True, если что-то поменялось.
+    """
+    wanted = {
+        ingredient['id']: ingredient['amount']
+        for ingredient in ingredients_data
+    }
+    current = {
+        row.ingredient_id: row
+        for row in IngredientAmount.objects.filter(recipe=recipe).only(
+            'id', 'ingredient_id', 'amount'
+        )
+    }
+    to_delete = [
+        row.id for ingredient_id, row in current.items()
+        if ingredient_id not in wanted
+    ]
+    to_update = []
+    for ingredient_id, row in current.items():
+        amount = wanted.get(ingredient_id)
+        if amount is not None and row.amount != amount:
+            row.amount = amount
+            to_update.append(row)
+    to_create = [
+        IngredientAmount(
+            recipe=recipe,
+            ingredient_id=ingredient_id,
+            amount=amount
+        )
+        for ingredient_id, amount in wanted.items()
+        if ingredient_id not in current
+    ]
+    if to_delete:
+        IngredientAmount.objects.filter(id__in=to_delete).delete()
+    if to_update:
+        IngredientAmount.objects.bulk_update(to_update, ['amount'])
+    if to_create:
+        IngredientAmount.objects.bulk_create(to_create)
+    return bool(to_delete or to_update or to_create)
+
+
+def update_recipe_tags(recipe: Recipe, tags) -> bool:
+    """
+    Привести тэги рецепта к tags, трогая только разницу.
+    Вернёт True, если что-то поменялось.
+    """
+    wanted = {tag.id for tag in tags}
+    current = set(
+        RecipeTag.objects.filter(recipe=recipe).values_list(
+            'tag_id', flat=True
+        )
+    )
+    if current - wanted:
+        RecipeTag.objects.filter(
+            recipe=recipe, tag_id__in=current - wanted
+        ).delete()
+    if wanted - current:
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=tag_id)
+            for tag_id in wanted - current
+        )
+    return current != wanted
+
+
+def pantry_ranking(pantry: set, min_coverage: float = 0):
+    """
+    Рецепты, где есть хоть один ингредиент из pantry, с долей
+    ингредиентов рецепта, которые в pantry есть. Один запрос
+    с группировкой по IngredientAmount, лучшие покрытия первыми.
+    """
+    ranking = IngredientAmount.objects.filter(
+        recipe_id__in=IngredientAmount.objects.filter(
+            ingredient_id__in=pantry
+        ).values('recipe_id')
+    ).values('recipe_id').annotate(
+        total=Count('id'),
+        matched=Count('id', filter=Q(ingredient_id__in=pantry))
+    ).annotate(
+        coverage=Cast('matched', FloatField()) / Cast('total', FloatField())
+    )
+    if min_coverage:
+        ranking = ranking.filter(coverage__gte=min_coverage)
+    return ranking.order_by('-coverage', '-matched', '-recipe_id')
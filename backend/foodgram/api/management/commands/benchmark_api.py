@@ -0,0 +1,296 @@
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from rest_framework.authtoken.models import Token
+
+from api.middleware import record_queries
+from recipes.models import Cart, Favorite, Ingredient, Recipe, Tag
+from users.models import Follow, User
+
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+GUNICORN_START_TIMEOUT = 30
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер задержек (p50/p95/p99), SQL-запросов на запрос и пропускной '
+        'способности основных маршрутов API. Результат пишется в JSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            action='store_true',
+            help='Сначала заполнить базу через seed_data.'
+        )
+        parser.add_argument('--users', type=int, default=20000)
+        parser.add_argument('--recipes', type=int, default=50000)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument(
+            '--url',
+            help='Замерять уже запущенный сервер, например '
+                 'http://127.0.0.1:8000.'
+        )
+        parser.add_argument(
+            '--gunicorn',
+            action='store_true',
+            help='Запустить gunicorn и замерять его.'
+        )
+        parser.add_argument('--gunicorn-workers', type=int, default=3)
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--random-seed', type=int, default=42)
+        parser.add_argument('--output', default='benchmark.json')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            self.seed(options)
+        user = self.get_user()
+        token, _ = Token.objects.get_or_create(user=user)
+        scenarios = self.get_scenarios(options['random_seed'])
+        report = {
+            'commit': self.get_commit(),
+            'created': datetime.now(timezone.utc).isoformat(),
+            'vendor': connection.vendor,
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'favorites': Favorite.objects.count(),
+                'carts': Cart.objects.count(),
+                'follows': Follow.objects.count(),
+            },
+            'runs': [],
+        }
+        report['runs'].append(self.run_in_process(token, scenarios, options))
+        if options['url']:
+            report['runs'].append(
+                self.run_http(options['url'], token, scenarios, options)
+            )
+        if options['gunicorn']:
+            with self.gunicorn(options) as url:
+                report['runs'].append(
+                    self.run_http(url, token, scenarios, options)
+                )
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        for run in report['runs']:
+            for name, result in run['scenarios'].items():
+                self.stdout.write(
+                    f'{run["mode"]} {name}: p50 {result["p50_ms"]} мс, '
+                    f'p95 {result["p95_ms"]} мс, '
+                    f'p99 {result["p99_ms"]} мс, '
+                    f'{result["rps"]} запр/с, '
+                    f'SQL {result["queries_per_request"]}'
+                )
+        self.stdout.write(
+            self.style.SUCCESS(f'Результат записан в {options["output"]}.')
+        )
+
+    def seed(self, options):
+        if not Ingredient.objects.exists() or not Tag.objects.exists():
+            # В dump.json те же ингредиенты, что в data/ingredients.csv,
+            # и тэги.
+            call_command(
+                'loaddata', os.path.join(settings.BASE_DIR, 'dump.json')
+            )
+        call_command(
+            'seed_data',
+            users=options['users'],
+            recipes=options['recipes'],
+            seed=options['random_seed']
+        )
+
+    def get_user(self):
+        """Пользователь с подписками, избранным и корзиной."""
+        user = User.objects.filter(
+            id__in=Cart.objects.values('user_id')
+        ).filter(
+            id__in=Follow.objects.values('user_id')
+        ).order_by('id').first()
+        if user is None:
+            raise CommandError('Нет данных, запустите с --seed.')
+        return user
+
+    def get_scenarios(self, seed):
+        """Маршруты для замера, у автодополнения — разные начала слов."""
+        rng = random.Random(seed)
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        prefixes = sorted({
+            name[:rng.randint(1, 3)] for name in rng.sample(
+                names, min(50, len(names))
+            )
+        })
+        return {
+            'recipes_list': ['/api/recipes/?limit=6'],
+            'subscriptions': [
+                '/api/users/subscriptions/?limit=6&recipes_limit=3'
+            ],
+            'shopping_cart_download': [
+                '/api/recipes/download_shopping_cart/'
+            ],
+            'ingredient_autocomplete': [
+                f'/api/ingredients/?name={prefix}' for prefix in prefixes
+            ],
+        }
+
+    def run_in_process(self, token, scenarios, options):
+        """Запросы через весь стек Django в этом процессе."""
+        client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        def call(path):
+            with record_queries() as recorder:
+                response = client.get(path)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            return response.status_code, recorder.count
+
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            return {
+                'mode': 'in-process',
+                'concurrency': 1,
+                'scenarios': {
+                    name: self.measure(call, paths, options, concurrency=1)
+                    for name, paths in scenarios.items()
+                },
+            }
+
+    def run_http(self, url, token, scenarios, options):
+        """
+        Запросы по HTTP к запущенному серверу. Кол-во SQL-запросов
+        берётся из Server-Timing, если на сервере QUERY_PROFILING=True.
+        """
+        session = requests.Session()
+        session.headers['Authorization'] = f'Token {token.key}'
+        adapter = requests.adapters.HTTPAdapter(
+            pool_maxsize=options['concurrency']
+        )
+        session.mount('http://', adapter)
+
+        def call(path):
+            response = session.get(url.rstrip('/') + path)
+            match = SERVER_TIMING_QUERIES.search(
+                response.headers.get('Server-Timing', '')
+            )
+            return response.status_code, (
+                int(match.group(1)) if match else None
+            )
+
+        return {
+            'mode': f'http {url}',
+            'concurrency': options['concurrency'],
+            'scenarios': {
+                name: self.measure(
+                    call, paths, options, options['concurrency']
+                )
+                for name, paths in scenarios.items()
+            },
+        }
+
+    def measure(self, call, paths, options, concurrency):
+        for index in range(options['warmup']):
+            call(paths[index % len(paths)])
+
+        def timed(index):
+            started = time.perf_counter()
+            status, queries = call(paths[index % len(paths)])
+            return time.perf_counter() - started, status, queries
+
+        started = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                samples = list(executor.map(timed, range(options['requests'])))
+        else:
+            samples = [timed(index) for index in range(options['requests'])]
+        wall = time.perf_counter() - started
+        return summarize(samples, wall)
+
+    def get_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True,
+                check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def gunicorn(self, options):
+        return GunicornServer(
+            options['port'], options['gunicorn_workers']
+        )
+
+
+class GunicornServer:
+    """gunicorn с этим проектом на время замера."""
+
+    def __init__(self, port, workers):
+        self.url = f'http://127.0.0.1:{port}'
+        self.command = [
+            sys.executable, '-m', 'gunicorn', 'foodgram.wsgi:application',
+            '--bind', f'127.0.0.1:{port}',
+            '--workers', str(workers),
+        ]
+        self.process = None
+
+    def __enter__(self):
+        env = dict(os.environ, QUERY_PROFILING='True')
+        env['ALLOWED_HOSTS'] = '127.0.0.1'
+        self.process = subprocess.Popen(
+            self.command, cwd=settings.BASE_DIR, env=env
+        )
+        deadline = time.monotonic() + GUNICORN_START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError('gunicorn не запустился.')
+            try:
+                requests.get(self.url + '/api/tags/', timeout=1)
+                return self.url
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        self.process.terminate()
+        raise CommandError('gunicorn не ответил вовремя.')
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.wait()
+
+
+def summarize(samples, wall):
+    """Процентили задержки, пропускная способность и SQL на запрос."""
+    latencies = sorted(duration * 1000 for duration, _, _ in samples)
+    if len(latencies) > 1:
+        percentiles = statistics.quantiles(
+            latencies, n=100, method='inclusive'
+        )
+    else:
+        percentiles = latencies * 99
+    queries = [count for _, _, count in samples if count is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for _, status, _ in samples if status >= 400),
+        'p50_ms': round(percentiles[49], 2),
+        'p95_ms': round(percentiles[94], 2),
+        'p99_ms': round(percentiles[98], 2),
+        'mean_ms': round(statistics.mean(latencies), 2),
+        'rps': round(len(samples) / wall, 1),
+        'queries_per_request': (
+            round(statistics.mean(queries), 2) if queries else None
+        ),
+    }
@@ -0,0 +1,116 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from rest_framework.test import force_authenticate
+
+from api.middleware import query_budget, record_queries
+from api.urls import router
+from recipes.models import Cart, Favorite, Ingredient, Recipe, Tag
+from users.models import User
+
+DETAIL_MODELS = {
+    'recipes': Recipe,
+    'users': User,
+    'tags': Tag,
+    'ingredients': Ingredient,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполнить GET-запросы ко всем маршрутам API и сравнить '
+        'кол-во SQL-запросов с бюджетами из QUERY_BUDGETS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            help='id пользователя, от имени которого идут запросы.'
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        params = {
+            'recipes-list': {'limit': 6},
+            'recipes-feed': {'limit': 6},
+            'recipes-pantry': {
+                'ingredients': list(
+                    Ingredient.objects.values_list('id', flat=True)[:10]
+                )
+            },
+            'users-user-subsctiptions': {'limit': 6, 'recipes_limit': 3},
+        }
+        factory = RequestFactory()
+        failed = []
+        # Без кэша: бюджет считается для худшего случая.
+        with override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+            }
+        }):
+            for pattern in router.urls:
+                actions = getattr(pattern.callback, 'actions', {})
+                name = pattern.name
+                groups = pattern.pattern.regex.groupindex
+                if 'get' not in actions or 'format' in groups:
+                    continue
+                kwargs = self.get_kwargs(pattern)
+                if kwargs is None:
+                    continue
+                path = self.get_path(pattern, kwargs)
+                request = factory.get(path, params.get(name, {}))
+                force_authenticate(request, user=user)
+                with record_queries() as recorder:
+                    response = pattern.callback(request, **kwargs)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                    else:
+                        response.render()
+                budget = query_budget(name)
+                line = (
+                    f'{name}: {recorder.count} из {budget} '
+                    f'(HTTP {response.status_code})'
+                )
+                if recorder.count > budget:
+                    failed.append(name)
+                    self.stdout.write(self.style.ERROR(line))
+                else:
+                    self.stdout.write(line)
+        if failed:
+            raise CommandError(
+                'Бюджет превышен: {0}.'.format(', '.join(failed))
+            )
+
+    def get_user(self, user_id):
+        if user_id is not None:
+            user = User.objects.filter(id=user_id).first()
+        else:
+            user = User.objects.filter(
+                id__in=Cart.objects.values('user_id')
+            ).filter(
+                id__in=Favorite.objects.values('user_id')
+            ).first()
+        if user is None:
+            raise CommandError(
+                'Пользователь не найден, выполните seed_data.'
+            )
+        return user
+
+    def get_kwargs(self, pattern):
+        """Значения параметров маршрута: id первых объектов."""
+        kwargs = {}
+        for group in pattern.pattern.regex.groupindex:
+            model = DETAIL_MODELS.get(pattern.name.split('-')[0])
+            if group != 'pk' or model is None:
+                return None
+            pk = model.objects.values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            kwargs[group] = str(pk)
+        return kwargs
+
+    def get_path(self, pattern, kwargs):
+        path = '/api/' + pattern.pattern.regex.pattern.strip('^$')
+        for group, value in kwargs.items():
+            path = path.replace(f'(?P<{group}>[^/.]+)', value)
+        return path
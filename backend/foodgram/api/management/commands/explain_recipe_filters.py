@@ -0,0 +1,98 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.http import QueryDict
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.filters import RecipeFilter
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Планы запросов (EXPLAIN ANALYZE в PostgreSQL) и время '
+        'выполнения для сочетаний фильтров списка рецептов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        author = User.objects.order_by('-recipes_count').first()
+        slugs = list(Tag.objects.values_list('slug', flat=True)[:2])
+        if author is None or not slugs:
+            raise CommandError('Нет данных, выполните seed_data.')
+        cases = {
+            'all': {},
+            'author': {'author': author.id},
+            'tag': {'tags': slugs[:1]},
+            'tags': {'tags': slugs},
+            'author_tags': {'author': author.id, 'tags': slugs},
+            'is_favorited': {'is_favorited': 1},
+            'is_favorited_tags': {'is_favorited': 1, 'tags': slugs},
+            'is_in_shopping_cart': {'is_in_shopping_cart': 1},
+        }
+        report = {
+            'vendor': connection.vendor,
+            'recipes': Recipe.objects.count(),
+            'cases': {}
+        }
+        for name, params in cases.items():
+            queryset = self.filtered_queryset(user, params)[:options['limit']]
+            report['cases'][name] = {
+                'params': params,
+                'plan': self.explain(queryset),
+                'median_ms': self.measure(queryset, options['repeat'])
+            }
+            self.stdout.write(
+                f'{name}: {report["cases"][name]["median_ms"]} мс'
+            )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def get_user(self, user_id):
+        users = User.objects.order_by('-id')
+        if user_id is not None:
+            users = users.filter(id=user_id)
+        user = users.first()
+        if user is None:
+            raise CommandError('Пользователь не найден.')
+        return user
+
+    def filtered_queryset(self, user, params):
+        query = QueryDict(mutable=True)
+        for key, value in params.items():
+            if isinstance(value, list):
+                query.setlist(key, value)
+            else:
+                query[key] = value
+        request = Request(RequestFactory().get('/api/recipes/', query))
+        request.user = user
+        return RecipeFilter(
+            query,
+            queryset=Recipe.objects.for_read(user),
+            request=request
+        ).qs
+
+    def explain(self, queryset):
+        if connection.vendor == 'postgresql':
+            return queryset.explain(analyze=True, buffers=True)
+        return queryset.explain()
+
+    def measure(self, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - started) * 1000)
+        return round(statistics.median(timings), 3)
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Списки IN разной длины считаются одним и тем же запросом.
+IN_LIST = re.compile(r'\((?:%s, )+%s\)')
+SLOWEST_QUERIES = 3
+
+
+class QueryBudgetExceeded(Exception):
+    """Запрос к API сделал больше SQL-запросов, чем позволено."""
+
+
+def fingerprint(sql: str) -> str:
+    """Отпечаток SQL без значений: одинаковый у повторов вида N+1."""
+    return hashlib.md5(IN_LIST.sub('(...)', sql).encode()).hexdigest()[:12]
+
+
+def query_budget(view_name: str) -> int:
+    """Сколько SQL-запросов можно сделать view_name."""
+    return settings.QUERY_BUDGETS.get(
+        view_name, settings.QUERY_BUDGET_DEFAULT
+    )
+
+
+class QueryRecorder:
+    """SQL-запросы и их время, собираются через execute_wrapper."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def duration(self) -> float:
+        return sum(duration for _, duration in self.queries)
+
+    def slowest(self, limit: int = SLOWEST_QUERIES) -> list:
+        return [
+            {'ms': round(duration * 1000, 2), 'sql': sql[:500]}
+            for sql, duration in sorted(
+                self.queries, key=lambda query: query[1], reverse=True
+            )[:limit]
+        ]
+
+    def duplicates(self) -> dict:
+        """Отпечатки запросов, выполненных больше одного раза."""
+        counts = Counter(fingerprint(sql) for sql, _ in self.queries)
+        return {key: count for key, count in counts.items() if count > 1}
+
+
+@contextmanager
+def record_queries():
+    """Записывать запросы всех подключений к базам внутри блока."""
+    recorder = QueryRecorder()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        yield recorder
+
+
+class QueryProfilingMiddleware:
+    """
+    Кол-во и время SQL-запросов каждого запроса: в заголовке
+    Server-Timing и в логе. При превышении бюджета из QUERY_BUDGETS
+    пишет предупреждение, а при QUERY_BUDGET_STRICT — падает.
+    Включается QUERY_PROFILING. Запросы потоковых ответов,
+    сделанные при отдаче тела, не учитываются.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        total = time.perf_counter() - started
+        response['Server-Timing'] = (
+            f'db;dur={recorder.duration * 1000:.2f};'
+            f'desc="{recorder.count} queries", '
+            f'app;dur={total * 1000:.2f}'
+        )
+        match = request.resolver_match
+        view_name = match.view_name if match else None
+        budget = query_budget(view_name)
+        report = {
+            'method': request.method,
+            'path': request.path,
+            'view': view_name,
+            'status': response.status_code,
+            'queries': recorder.count,
+            'budget': budget,
+            'db_ms': round(recorder.duration * 1000, 2),
+            'total_ms': round(total * 1000, 2),
+            'duplicates': recorder.duplicates(),
+        }
+        if recorder.count <= budget:
+            logger.info(json.dumps(report, ensure_ascii=False))
+            return response
+        report['slowest'] = recorder.slowest()
+        logger.warning(json.dumps(report, ensure_ascii=False))
+        if settings.QUERY_BUDGET_STRICT:
+            raise QueryBudgetExceeded(
+                f'{view_name}: {recorder.count} SQL-запросов '
+                f'при бюджете {budget}.'
+            )
+        return response
@@ -0,0 +1,11 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class ExportFormatNegotiation(DefaultContentNegotiation):
+    """
+    Рендерер выбирается по заголовку Accept как обычно,
+    а ?format= задаёт формат выгрузки и на него не влияет.
+    """
+
+    def filter_renderers(self, renderers, format):
+        return renderers
@@ -1,6 +1,56 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 5
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Постраничный вывод рецептов по курсору (pub_date, id),
+    без подсчёта общего кол-ва и OFFSET. Результаты поиска
+    упорядочены по релевантности, курсор для них недоступен.
+    """
+    page_size = 5
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if request.query_params.get('search'):
+            raise ValidationError(
+                {'pagination': [
+                    'Результаты поиска выводятся только по страницам.'
+                ]}
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+
+class UserCursorPagination(CursorPagination):
+    """Постраничный вывод пользователей по курсору."""
+    page_size = 5
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    ordering = 'username'
+
+
+class CursorPaginationMixin:
+    """
+    Вывод по курсору вместо номеров страниц,
+    если в запросе передан pagination=cursor.
+    """
+    cursor_pagination_class = None
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if (
+                self.pagination_class is not None
+                and self.cursor_pagination_class is not None
+                and self.request.query_params.get('pagination') == 'cursor'
+            ):
+                self._paginator = self.cursor_pagination_class()
+                return self._paginator
+        return super().paginator
@@ -0,0 +1,31 @@
+import json
+
+from django.utils.datastructures import MultiValueDict
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+
+class MultiPartJSONParser(MultiPartParser):
+    """
+    multipart/form-data, где поля можно передать обычными полями формы
+    или одной JSON-частью data. Файлы пишутся на диск обработчиками
+    загрузки Django и не читаются в память целиком.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        result = super().parse(stream, media_type, parser_context)
+        if 'data' not in result.data:
+            return result
+        try:
+            payload = json.loads(result.data['data'])
+        except ValueError as error:
+            raise ParseError(f'Некорректный JSON в части data: {error}')
+        if not isinstance(payload, dict):
+            raise ParseError('Часть data должна быть JSON-объектом.')
+        data = {
+            key: value for key, value in result.data.dict().items()
+            if key != 'data'
+        }
+        data.update(payload)
+        data.update(result.files.dict())
+        return DataAndFiles(data, MultiValueDict())
@@ -1,9 +1,9 @@
+from django.db import transaction
 from django.db.models import F
-from django.shortcuts import get_object_or_404
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.validators import ValidationError
 
+from recipes.images import schedule_recipe_image
 from recipes.models import (
     Cart,
     Favorite,
@@ -13,7 +13,15 @@ from recipes.models import (
     Tag
 )
 from users.models import Follow, User
-from .handlers import create_ingredients_connections
+from .fields import ImageRenditionField, RecipeImageField
+from .handlers import (
+    bump_recipe_shopping_carts,
+    create_ingredients_connections,
+    fan_out_recipe,
+    get_recipes_limit,
+    update_ingredients_connections,
+    update_recipe_tags
+)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -41,6 +49,8 @@ class UserSerializer(serializers.ModelSerializer):
         }
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context['request']
         return Follow.objects.filter(
             user=request.user.id,
@@ -90,9 +100,7 @@ class UserFollowedSerializer(UserSerializer):
     recipes = serializers.SerializerMethodField(
         method_name='get_recipes'
     )
-    recipes_count = serializers.SerializerMethodField(
-        method_name='get_recipes_count'
-    )
+    recipes_count = serializers.IntegerField(read_only=True)
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -106,15 +114,14 @@ class UserFollowedSerializer(UserSerializer):
         }
 
     def get_recipes(self, obj):
-        request = self.context['request']
-        recipes_limit = int(request.GET.get('recipes_limit', 5))
-        recipes = Recipe.objects.filter(author=obj)[:recipes_limit]
+        if hasattr(obj, 'recipes_preview'):
+            recipes = obj.recipes_preview
+        else:
+            recipes_limit = get_recipes_limit(self.context['request'])
+            recipes = Recipe.objects.filter(author=obj)[:recipes_limit]
         serializer = self.get_recipes_serializer(recipes, many=True)
         return serializer.data
 
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
-
     def get_recipes_serializer(self, *args, **kwargs):
         serializer_class = ShortenRecipeSerializer
         kwargs.setdefault('context', self.context)
@@ -149,26 +156,45 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
         many=True
     )
     author = UserFollowedForRecipeSerializer()
-    image = Base64ImageField()
+    image = ImageRenditionField()
 
     class Meta:
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
                   'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'cooking_time', 'favorites_count', 'image_status')
         model = Recipe
         extra_kwargs = {
             'id': {'read_only': True}
         }
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
     def get_ingredients(self, obj):
-        return obj.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('ingredientamount__amount')
-        )
+        ingredient_amounts = obj.ingredientamount_set.all()
+        if 'ingredientamount_set' not in getattr(
+            obj, '_prefetched_objects_cache', {}
+        ):
+            ingredient_amounts = ingredient_amounts.select_related(
+                'ingredient'
+            )
+        return [
+            {
+                'id': ingredient_amount.ingredient.id,
+                'name': ingredient_amount.ingredient.name,
+                'measurement_unit': (
+                    ingredient_amount.ingredient.measurement_unit
+                ),
+                'amount': ingredient_amount.amount
+            }
+            for ingredient_amount in ingredient_amounts
+        ]
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context['request']
         return Favorite.objects.filter(
             user=request.user.id,
@@ -176,6 +202,8 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
         ).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context['request']
         return Cart.objects.filter(
             user=request.user.id,
@@ -183,17 +211,34 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
         ).exists()
 
 
+class PantryRecipeSerializer(ReadRecipeSerializer):
+    """Рецепт с долей ингредиентов, которые есть у пользователя."""
+    coverage = serializers.FloatField(read_only=True)
+    missing_ingredients = serializers.SerializerMethodField()
+
+    class Meta(ReadRecipeSerializer.Meta):
+        fields = ReadRecipeSerializer.Meta.fields + (
+            'coverage', 'missing_ingredients'
+        )
+
+    def get_missing_ingredients(self, obj):
+        pantry = self.context['pantry']
+        return [
+            ingredient for ingredient in self.get_ingredients(obj)
+            if ingredient['id'] not in pantry
+        ]
+
+
 class RecipeSerializer(serializers.ModelSerializer):
     """Сериализатор рецептов."""
     ingredients = IngredientForRecipeSerializer(
         many=True
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True,
-        queryset=Tag.objects.all()
+    tags = serializers.ListField(
+        child=serializers.IntegerField(min_value=1)
     )
     author = UserSerializer(read_only=True)
-    image = Base64ImageField()
+    image = RecipeImageField()
 
     class Meta:
         fields = ('id', 'tags', 'author', 'ingredients',
@@ -224,34 +269,91 @@ class RecipeSerializer(serializers.ModelSerializer):
                     'ingredients': 'Ингредиенты должны быть уникальными.'
                 }
             )
+        ingredient_ids = set(ingredients_id_lst)
+        missing = ingredient_ids - set(
+            Ingredient.objects.filter(id__in=ingredient_ids).values_list(
+                'id', flat=True
+            )
+        )
+        if missing:
+            raise ValidationError(
+                {
+                    'ingredients': 'Ингредиенты не найдены: {0}'.format(
+                        ', '.join(map(str, sorted(missing)))
+                    )
+                }
+            )
         data['ingredients'] = ingredients
         return data
 
+    def validate_tags(self, value):
+        tag_ids = list(dict.fromkeys(value))
+        tags = Tag.objects.in_bulk(tag_ids)
+        missing = set(tag_ids) - tags.keys()
+        if missing:
+            raise ValidationError(
+                'Тэги не найдены: {0}'.format(
+                    ', '.join(map(str, sorted(missing)))
+                )
+            )
+        return [tags[tag_id] for tag_id in tag_ids]
+
+    @transaction.atomic
     def create(self, validated_data):
         image = validated_data.pop('image')
         tags_data = validated_data.pop('tags')
         ingredients_data = validated_data.pop('ingredients')
-        recipe = Recipe.objects.create(image=image, **validated_data)
-        recipe.tags.set(tags_data)
+        recipe = Recipe.objects.create(
+            image_status=Recipe.IMAGE_PROCESSING,
+            **validated_data
+        )
+        User.objects.filter(pk=recipe.author_id).update(
+            recipes_count=F('recipes_count') + 1
+        )
+        recipe.tags.add(*tags_data)
         create_ingredients_connections(recipe, ingredients_data)
+        fan_out_recipe(recipe)
+        schedule_recipe_image(recipe, image)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients_data = validated_data.pop('ingredients')
-        IngredientAmount.objects.filter(recipe=instance).delete()
-        create_ingredients_connections(instance, ingredients_data)
-        return super().update(instance, validated_data)
+        image = validated_data.pop('image', None)
+        if image is not None:
+            validated_data['image_status'] = Recipe.IMAGE_PROCESSING
+        tags = validated_data.pop('tags', None)
+        changed = False
+        if update_ingredients_connections(
+            instance, validated_data.pop('ingredients')
+        ):
+            changed = True
+            transaction.on_commit(
+                lambda: bump_recipe_shopping_carts(instance)
+            )
+        if tags is not None and update_recipe_tags(instance, tags):
+            changed = True
+        fields = [
+            field for field, value in validated_data.items()
+            if getattr(instance, field) != value
+        ]
+        for field in fields:
+            setattr(instance, field, validated_data[field])
+        if fields or changed:
+            instance.save(update_fields=fields + ['pub_date'])
+        if image is not None:
+            schedule_recipe_image(instance, image)
+        return instance
 
     def to_representation(self, instance):
         return ReadRecipeSerializer(
             instance,
-            context={'request': self.context['request']}
+            context=self.context
         ).data
 
 
 class ShortenRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор укороченных рецептов."""
-    image = Base64ImageField()
+    image = ImageRenditionField(rendition='image_thumbnail')
 
     class Meta:
         model = Recipe
@@ -273,80 +375,36 @@ class PasswordSerializer(serializers.Serializer):
         return data
 
 
-class FollowSerializer(serializers.Serializer):
-    """Сериализатор подписок."""
-    def validate(self, data):
-        request = self.context['request']
-        author = get_object_or_404(
-            User,
-            id=self.context['view'].kwargs['user_id']
-        )
-        user = request.user
-        if request.method == 'POST':
-            if author == user:
-                raise ValidationError(
-                    {'error': 'Нельзя подписаться на себя!'}
-                )
-            if Follow.objects.filter(author=author, user=user).exists():
-                raise ValidationError(
-                    {'error': 'Вы уже подписаны на этого пользователя!'}
-                )
-        if request.method == 'DELETE':
-            if not Follow.objects.filter(
-                author=author,
-                user=user
-            ).exists():
-                raise ValidationError(
-                    {'error': 'Вы не подписаны на этого пользователя!'}
-                )
-        return data
-
+class RecipeIdsSerializer(serializers.Serializer):
+    """Сериализатор списка рецептов для корзины и избранного."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100
+    )
 
-class ShoppingCartSerializer(serializers.Serializer):
-    """Сериализатор для корзины"""
-    def validate(self, data):
-        request = self.context['request']
-        recipe = get_object_or_404(
-            Recipe,
-            id=self.context['view'].kwargs['recipe_id']
-        )
-        user = request.user
-        if request.method == 'POST':
-            if Cart.objects.filter(user=user, recipe=recipe).exists():
-                raise ValidationError(
-                    {'error': 'Рецепт уже в корзине!'}
-                )
-        if request.method == 'DELETE':
-            if not Cart.objects.filter(
-                user=user,
-                recipe=recipe
-            ).exists():
-                raise ValidationError(
-                    {'error': 'Рецепта нет в корзине!'}
+    def validate_recipes(self, value):
+        recipe_ids = set(value)
+        recipes = list(Recipe.objects.filter(id__in=recipe_ids))
+        missing = recipe_ids - {recipe.id for recipe in recipes}
+        if missing:
+            raise ValidationError(
+                'Рецепты не найдены: {0}'.format(
+                    ', '.join(map(str, sorted(missing)))
                 )
-        return data
+            )
+        return recipes
 
 
-class FavoriteSerializer(serializers.Serializer):
-    """Сериализатор регистрации пользователей."""
-    def validate(self, data):
-        request = self.context['request']
-        recipe = get_object_or_404(
-            Recipe,
-            id=self.context['view'].kwargs['recipe_id']
-        )
-        user = request.user
-        if request.method == 'POST':
-            if Favorite.objects.filter(user=user, recipe=recipe).exists():
-                raise ValidationError(
-                    {'error': 'Рецепт уже в избранном!'}
-                )
-        if request.method == 'DELETE':
-            if not Favorite.objects.filter(
-                user=user,
-                recipe=recipe
-            ).exists():
-                raise ValidationError(
-                    {'error': 'Рецепта нет в избранном!'}
-                )
-        return data
+class PantrySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по имеющимся ингредиентам."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=200
+    )
+    min_coverage = serializers.FloatField(
+        min_value=0,
+        max_value=1,
+        default=0
+    )
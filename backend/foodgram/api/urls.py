@@ -2,6 +2,8 @@ from django.urls import include, path
 from rest_framework import routers
 
 from .views import (
+    BulkFavoriteViewSet,
+    BulkShoppingCartViewSet,
     FavoriteViewSet,
     FollowViewSet,
     IngredientViewSet,
@@ -19,6 +21,16 @@ router.register(
     basename='subscribe'
 )
 router.register(r'ingredients', IngredientViewSet, basename='ingredients')
+router.register(
+    r'recipes/shopping_cart',
+    BulkShoppingCartViewSet,
+    basename='shopping_cart_bulk'
+)
+router.register(
+    r'recipes/favorite',
+    BulkFavoriteViewSet,
+    basename='favorite_bulk'
+)
 router.register(r'recipes', RecipeViewSet, basename='recipes')
 router.register(
     r'recipes/(?P<recipe_id>\d+)/shopping_cart',
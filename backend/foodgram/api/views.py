@@ -1,85 +1,282 @@
-from django.forms.models import model_to_dict
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, F, OuterRef, Value
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 
+from recipes.catalog import ingredient_catalog
+from recipes.counters import refresh_favorites_count
+from recipes.images import MEDIA_FIELDS, release_files
 from recipes.models import Cart, Favorite, Ingredient, Recipe, Tag
+from recipes.recommendations import (
+    recommended_recipes,
+    schedule_record_favorites,
+    similar_recipes
+)
 from users.models import Follow, User
-from .filters import IngredientFilter, RecipeFilter
-from .handlers import ingredients_extract
-from .pagination import CustomPagination
+from .filters import (
+    IngredientFilter,
+    RecipeFilter,
+    ingredient_search_limit
+)
+from .handlers import (
+    SHOPPING_CART_EXPORTS,
+    SHORT_RECIPE_FIELDS,
+    bump_shopping_cart_version,
+    clear_feed,
+    fill_feed,
+    get_recipes_limit,
+    get_recommendations_limit,
+    ingredients_etag,
+    ingredients_last_modified,
+    pantry_ranking,
+    recipe_etag,
+    shopping_cart_ingredients,
+    tags_etag,
+    tags_last_modified,
+    with_recipes_preview
+)
+from .negotiation import ExportFormatNegotiation
+from .pagination import (
+    CursorPaginationMixin,
+    CustomPagination,
+    RecipeCursorPagination,
+    UserCursorPagination
+)
 from .permissions import (
     IsAdminOrReadOnly,
     IsAuthenticatedOrSignUp,
     RecipePermissions
 )
+from .parsers import MultiPartJSONParser
 from .serializers import (
-    FavoriteSerializer,
-    FollowSerializer,
     IngredientSerializer,
+    PantryRecipeSerializer,
+    PantrySerializer,
     PasswordSerializer,
+    ReadRecipeSerializer,
     RecipeSerializer,
-    ShoppingCartSerializer,
+    ShortenRecipeSerializer,
     TagSerializer,
     UserFollowedSerializer,
     UserSerializer
 )
-from .viewsets import CustomViewsetForFavoriteAndCart
+from .viewsets import (
+    CustomBulkViewsetForFavoriteAndCart,
+    CustomViewsetForFavoriteAndCart
+)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+@method_decorator(condition(etag_func=recipe_etag), name='retrieve')
+class RecipeViewSet(CursorPaginationMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (RecipePermissions,)
     serializer_class = RecipeSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = CustomPagination
+    cursor_pagination_class = RecipeCursorPagination
+    parser_classes = (JSONParser, MultiPartJSONParser)
+
+    def get_queryset(self):
+        return Recipe.objects.for_read(self.request.user)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'feed', 'pantry'):
+            context['image_rendition'] = 'image_card'
+        return context
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        # Корзины читаются до удаления, а версии меняются после коммита:
+        # иначе успевший список покупок закэшируется с удалённым рецептом.
+        user_ids = list(
+            Cart.objects.filter(recipe=instance).values_list(
+                'user_id', flat=True
+            )
+        )
+        files = [getattr(instance, field).name for field in MEDIA_FIELDS]
+        with transaction.atomic():
+            instance.delete()
+            User.objects.filter(pk=instance.author_id).update(
+                recipes_count=F('recipes_count') - 1
+            )
+            transaction.on_commit(
+                lambda: bump_shopping_cart_version(*user_ids)
+            )
+            transaction.on_commit(lambda: release_files(files))
+
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='feed',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def feed(self, request):
+        recipes = self.get_queryset()
+        if settings.FEED_FANOUT:
+            recipes = recipes.filter(feed_items__user=request.user)
+        else:
+            recipes = recipes.filter(author__following__user=request.user)
+        page = self.paginate_queryset(self.filter_queryset(recipes))
+        serializer = ReadRecipeSerializer(
+            page,
+            many=True,
+            context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='pantry',
+        pagination_class=CustomPagination,
+        cursor_pagination_class=None,
+    )
+    def pantry(self, request):
+        params = PantrySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        pantry = set(params.validated_data['ingredients'])
+        page = self.paginate_queryset(
+            pantry_ranking(pantry, params.validated_data['min_coverage'])
+        )
+        recipes = self.get_queryset().in_bulk(
+            [row['recipe_id'] for row in page]
+        )
+        ranked = []
+        for row in page:
+            recipe = recipes.get(row['recipe_id'])
+            if recipe is not None:
+                recipe.coverage = row['coverage']
+                ranked.append(recipe)
+        serializer = PantryRecipeSerializer(
+            ranked,
+            many=True,
+            context={**self.get_serializer_context(), 'pantry': pantry}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        methods=['get'],
+        detail=True,
+        url_path='similar',
+    )
+    def similar(self, request, pk=None):
+        recipes = similar_recipes(pk).only(*SHORT_RECIPE_FIELDS)
+        serializer = ShortenRecipeSerializer(
+            recipes[:get_recommendations_limit(request)],
+            many=True,
+            context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='recommended',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def recommended(self, request):
+        recipes = recommended_recipes(request.user).only(
+            *SHORT_RECIPE_FIELDS
+        )
+        serializer = ShortenRecipeSerializer(
+            recipes[:get_recommendations_limit(request)],
+            many=True,
+            context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+
     @action(
         methods=['get'],
         detail=False,
         url_path='download_shopping_cart',
         permission_classes=[permissions.IsAuthenticated],
         serializer_class=RecipeSerializer,
+        content_negotiation_class=ExportFormatNegotiation,
     )
     def download_shopping_cart(self, request):
-        filename = 'Spisok_pokypok.txt'
-        response = HttpResponse(
-            content_type='text/plain; charset=UTF-8'
+        export_format = request.query_params.get('format', 'txt')
+        if export_format not in SHOPPING_CART_EXPORTS:
+            raise ValidationError(
+                {'format': [
+                    'Доступные форматы: {0}.'.format(
+                        ', '.join(SHOPPING_CART_EXPORTS)
+                    )
+                ]}
+            )
+        export, content_type = SHOPPING_CART_EXPORTS[export_format]
+        filename = 'Spisok_pokypok.{0}'.format(export_format)
+        response = StreamingHttpResponse(
+            export(shopping_cart_ingredients(request.user)),
+            content_type=content_type
         )
         response['Content-Disposition'] = (
             'attachment; filename={0}'.format(filename)
         )
-        response.writelines(ingredients_extract(request))
         return response
 
 
 class ShoppingCartViewSet(CustomViewsetForFavoriteAndCart):
     model = Cart
     queryset = model.objects.all()
-    serializer_class = ShoppingCartSerializer
+    invalidates_shopping_cart = True
+    already_exists_message = 'Рецепт уже в корзине!'
+    does_not_exist_message = 'Рецепта нет в корзине!'
 
 
 class FavoriteViewSet(CustomViewsetForFavoriteAndCart):
     model = Favorite
     queryset = model.objects.all()
-    serializer_class = FavoriteSerializer
+    counter_field = 'favorites_count'
+    record_added = staticmethod(schedule_record_favorites)
+    already_exists_message = 'Рецепт уже в избранном!'
+    does_not_exist_message = 'Рецепта нет в избранном!'
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class BulkShoppingCartViewSet(CustomBulkViewsetForFavoriteAndCart):
+    model = Cart
+    invalidates_shopping_cart = True
+
+
+class BulkFavoriteViewSet(CustomBulkViewsetForFavoriteAndCart):
+    model = Favorite
+    refresh_counter = staticmethod(refresh_favorites_count)
+    record_added = staticmethod(schedule_record_favorites)
+
+
+class UserViewSet(CursorPaginationMixin, viewsets.ModelViewSet):
     queryset = User.objects.all().order_by('username')
     permission_classes = (IsAuthenticatedOrSignUp,)
     serializer_class = UserSerializer
     pagination_class = CustomPagination
+    cursor_pagination_class = UserCursorPagination
     ordering = 'id'
     http_method_names = ['get', 'post']
 
+    def get_queryset(self):
+        if self.action not in ('list', 'retrieve'):
+            return super().get_queryset()
+        return super().get_queryset().annotate(
+            is_subscribed=Exists(
+                Follow.objects.filter(
+                    user=self.request.user.id,
+                    author=OuterRef('pk')
+                )
+            )
+        )
+
     @action(
         methods=['get'],
         detail=False,
@@ -99,10 +296,12 @@ class UserViewSet(viewsets.ModelViewSet):
         serializer_class=UserFollowedSerializer,
     )
     def user_subsctiptions(self, request):
-        author_ids = Follow.objects.filter(
-            user=request.user
-        ).values_list('author', flat=True)
-        users = User.objects.filter(pk__in=author_ids)
+        users = with_recipes_preview(
+            User.objects.filter(following__user=request.user),
+            get_recipes_limit(request)
+        ).annotate(
+            is_subscribed=Value(True)
+        ).order_by('username')
         page = self.paginate_queryset(users)
         serializer = self.get_serializer(page, many=True)
         return self.get_paginated_response(serializer.data)
@@ -127,6 +326,13 @@ class UserViewSet(viewsets.ModelViewSet):
         )
 
 
+@method_decorator(
+    condition(
+        etag_func=tags_etag,
+        last_modified_func=tags_last_modified
+    ),
+    name='dispatch'
+)
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     permission_classes = (IsAdminOrReadOnly,)
@@ -134,6 +340,13 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     pagination_class = None
 
 
+@method_decorator(
+    condition(
+        etag_func=ingredients_etag,
+        last_modified_func=ingredients_last_modified
+    ),
+    name='dispatch'
+)
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     permission_classes = (IsAdminOrReadOnly,)
@@ -142,21 +355,59 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        if (
+            not settings.INGREDIENT_CATALOG_CACHE
+            or settings.INGREDIENT_TRIGRAM_SEARCH
+        ):
+            return super().list(request, *args, **kwargs)
+        name = request.query_params.get('name')
+        if name is None:
+            return Response(ingredient_catalog.all())
+        return Response(
+            ingredient_catalog.search(
+                name,
+                ingredient_search_limit(request.query_params)
+            )
+        )
+
 
 class FollowViewSet(viewsets.ModelViewSet):
     queryset = Follow.objects.all()
     permission_classes = (permissions.IsAuthenticated,)
     http_method_names = ['post', 'delete']
-    serializer_class = FollowSerializer
+    serializer_class = UserFollowedSerializer
 
     def create(self, request, *args, **kwargs):
-        author = get_object_or_404(User, id=kwargs['user_id'])
-        serializer = self.get_serializer(data=model_to_dict(author))
-        serializer.is_valid(raise_exception=True)
-        Follow.objects.create(
-            author=author,
-            user=request.user
+        # Ответ с рецептами автора собирается только после вставки:
+        # повтор и подписка на себя не платят за его выборку.
+        if int(kwargs['user_id']) == request.user.id:
+            raise ValidationError(
+                {'error': ['Нельзя подписаться на себя!']}
+            )
+        author_id = get_object_or_404(
+            User.objects.values_list('id', flat=True),
+            id=kwargs['user_id']
         )
+        try:
+            with transaction.atomic():
+                Follow.objects.create(
+                    author_id=author_id,
+                    user=request.user
+                )
+                User.objects.filter(pk=author_id).update(
+                    followers_count=F('followers_count') + 1
+                )
+                fill_feed(request.user.id, author_id)
+        except IntegrityError:
+            raise ValidationError(
+                {'error': ['Вы уже подписаны на этого пользователя!']}
+            )
+        author = with_recipes_preview(
+            User.objects.filter(pk=author_id),
+            get_recipes_limit(request)
+        ).get()
+        author.is_subscribed = True
         serialized_user = self.get_user_serializer(
             instance=author
         )
@@ -166,14 +417,22 @@ class FollowViewSet(viewsets.ModelViewSet):
         )
 
     def delete(self, request, *args, **kwargs):
-        author = get_object_or_404(User, id=kwargs['user_id'])
-        serializer = self.get_serializer(data=model_to_dict(author))
-        serializer.is_valid(raise_exception=True)
-        Follow.objects.filter(author=author, user=request.user).delete()
-        return Response(
-            serializer.data,
-            status=status.HTTP_204_NO_CONTENT
-        )
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(
+                author_id=kwargs['user_id'],
+                user=request.user
+            ).delete()
+            if deleted:
+                User.objects.filter(pk=kwargs['user_id']).update(
+                    followers_count=F('followers_count') - 1
+                )
+                clear_feed(request.user.id, kwargs['user_id'])
+        if not deleted:
+            get_object_or_404(User, id=kwargs['user_id'])
+            raise ValidationError(
+                {'error': ['Вы не подписаны на этого пользователя!']}
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
     def get_user_serializer(self, *args, **kwargs):
         serializer_class = UserFollowedSerializer
@@ -1,27 +1,52 @@
-from django.forms.models import model_to_dict
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from django.shortcuts import get_object_or_404
 from rest_framework import status, viewsets
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
 from recipes.models import Recipe
-from .serializers import ShortenRecipeSerializer
+from .handlers import SHORT_RECIPE_FIELDS, bump_shopping_cart_version
+from .serializers import RecipeIdsSerializer, ShortenRecipeSerializer
 
 
 class CustomViewsetForFavoriteAndCart(
     viewsets.ModelViewSet
 ):
+    """
+    Добавление и удаление рецепта. Повторы отсекаются
+    уникальными ограничениями модели, без отдельных проверок.
+    """
     permission_classes = (IsAuthenticated,)
     http_method_names = ['post', 'delete']
+    serializer_class = ShortenRecipeSerializer
+    invalidates_shopping_cart = False
+    counter_field = None
+    record_added = None
+    already_exists_message = None
+    does_not_exist_message = None
 
     def create(self, request, *args, **kwargs):
-        recipe = get_object_or_404(Recipe, id=kwargs['recipe_id'])
-        serializer = self.get_serializer(data=model_to_dict(recipe))
-        serializer.is_valid(raise_exception=True)
-        self.model.objects.create(
-            user=request.user,
-            recipe=recipe
+        recipe = get_object_or_404(
+            Recipe.objects.only(*SHORT_RECIPE_FIELDS),
+            id=kwargs['recipe_id']
         )
+        try:
+            with transaction.atomic():
+                self.model.objects.create(
+                    user=request.user,
+                    recipe=recipe
+                )
+                self.update_counter(recipe.id, 1)
+        except IntegrityError:
+            raise ValidationError(
+                {'error': [self.already_exists_message]}
+            )
+        if self.invalidates_shopping_cart:
+            bump_shopping_cart_version(request.user.id)
+        if self.record_added is not None:
+            self.record_added(request.user.id, [recipe.id])
         serialized_recipe = self.get_recipe_serializer(
             instance=recipe
         )
@@ -31,16 +56,105 @@ class CustomViewsetForFavoriteAndCart(
         )
 
     def delete(self, request, *args, **kwargs):
-        recipe = get_object_or_404(Recipe, id=kwargs['recipe_id'])
-        serializer = self.get_serializer(data=model_to_dict(recipe))
+        with transaction.atomic():
+            deleted, _ = self.model.objects.filter(
+                user=request.user,
+                recipe_id=kwargs['recipe_id']
+            ).delete()
+            if deleted:
+                self.update_counter(kwargs['recipe_id'], -1)
+        if not deleted:
+            get_object_or_404(Recipe, id=kwargs['recipe_id'])
+            raise ValidationError(
+                {'error': [self.does_not_exist_message]}
+            )
+        if self.invalidates_shopping_cart:
+            bump_shopping_cart_version(request.user.id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def update_counter(self, recipe_id, delta):
+        if self.counter_field is None:
+            return
+        Recipe.objects.filter(pk=recipe_id).update(
+            **{self.counter_field: F(self.counter_field) + delta}
+        )
+
+    def get_recipe_serializer(self, *args, **kwargs):
+        serializer_class = ShortenRecipeSerializer
+        kwargs.setdefault(
+            'context',
+            self.get_serializer_context()
+        )
+        return serializer_class(*args, **kwargs)
+
+
+class CustomBulkViewsetForFavoriteAndCart(
+    viewsets.GenericViewSet
+):
+    """Добавление и удаление нескольких рецептов одним запросом."""
+    permission_classes = (IsAuthenticated,)
+    http_method_names = ['post', 'delete']
+    serializer_class = RecipeIdsSerializer
+    invalidates_shopping_cart = False
+    refresh_counter = None
+    record_added = None
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        self.model.objects.filter(
-            user=request.user,
-            recipe=recipe
-        ).delete()
+        recipes = serializer.validated_data['recipes']
+        with transaction.atomic():
+            existing = set()
+            if self.record_added is not None:
+                existing = set(
+                    self.model.objects.filter(
+                        user=request.user,
+                        recipe__in=recipes
+                    ).values_list('recipe_id', flat=True)
+                )
+            self.model.objects.bulk_create(
+                [
+                    self.model(user=request.user, recipe=recipe)
+                    for recipe in recipes
+                ],
+                ignore_conflicts=True
+            )
+            self.update_counters(recipes)
+        if self.invalidates_shopping_cart:
+            bump_shopping_cart_version(request.user.id)
+        if self.record_added is not None:
+            self.record_added(
+                request.user.id,
+                [recipe.id for recipe in recipes if recipe.id not in existing]
+            )
+        serialized_recipes = self.get_recipe_serializer(
+            instance=recipes,
+            many=True
+        )
         return Response(
-            serializer.data,
-            status=status.HTTP_204_NO_CONTENT
+            serialized_recipes.data,
+            status=status.HTTP_201_CREATED
+        )
+
+    def delete(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.validated_data['recipes']
+        with transaction.atomic():
+            self.model.objects.filter(
+                user=request.user,
+                recipe__in=recipes
+            ).delete()
+            self.update_counters(recipes)
+        if self.invalidates_shopping_cart:
+            bump_shopping_cart_version(request.user.id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def update_counters(self, recipes):
+        if self.refresh_counter is None:
+            return
+        self.refresh_counter(
+            Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes])
         )
 
     def get_recipe_serializer(self, *args, **kwargs):
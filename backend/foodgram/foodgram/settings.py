@@ -21,6 +21,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'django_filters',
     'djoser',
     'rest_framework',
@@ -31,6 +32,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +86,21 @@ DATABASES = {
     }
 }
 
+# Версии таблиц и списков покупок должны быть общими для всех
+# процессов, поэтому по умолчанию кэш в файлах, а не в памяти.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            '/var/tmp/foodgram_cache'
+        )
+    }
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -116,6 +133,19 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'recipes.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Файлы моложе этого (в секундах) не удаляются, даже если на них
+# нет ссылок: их могли только что загрузить для другого рецепта.
+MEDIA_ORPHAN_MIN_AGE = 3600
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
@@ -134,6 +164,73 @@ PASSWORD_HASHERS = [
     'django.contrib.auth.hashers.Argon2PasswordHasher',
 ]
 
+INGREDIENT_SEARCH_LIMIT = 20
+
+INGREDIENT_SEARCH_MAX_LIMIT = 100
+
+INGREDIENT_TRIGRAM_SEARCH = os.getenv('INGREDIENT_TRIGRAM_SEARCH') == 'True'
+
+INGREDIENT_CATALOG_CACHE = os.getenv('INGREDIENT_CATALOG_CACHE') == 'True'
+
+FEED_FANOUT = os.getenv('FEED_FANOUT') == 'True'
+
+RECIPE_SEARCH_CONFIG = 'russian'
+
+RECOMMENDATION_NEIGHBOURS = 20
+
+# Потоки для фоновых задач: картинки рецептов, соседи рецептов.
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', 2))
+
+IMAGE_RENDITIONS = {
+    'image': 1600,
+    'image_card': 600,
+    'image_thumbnail': 200,
+}
+
+IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+
+QUERY_PROFILING = os.getenv('QUERY_PROFILING') == 'True'
+
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT') == 'True'
+
+QUERY_BUDGET_DEFAULT = 10
+
+# Сколько SQL-запросов можно сделать маршруту API (по имени из роутера).
+QUERY_BUDGETS = {
+    'users-list': 2,
+    'users-detail': 1,
+    'users-users-own-profile': 1,
+    'users-user-subsctiptions': 3,
+    'ingredients-list': 1,
+    'ingredients-detail': 1,
+    'tags-list': 1,
+    'tags-detail': 1,
+    'recipes-list': 4,
+    'recipes-detail': 4,
+    'recipes-feed': 4,
+    'recipes-pantry': 5,
+    'recipes-similar': 1,
+    'recipes-recommended': 1,
+    'recipes-download-shopping-cart': 1,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.middleware': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}
+
 DJOSER = {
     'LOGIN_FIELD': 'email'
 }
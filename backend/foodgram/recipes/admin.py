@@ -1,16 +1,22 @@
 from django.contrib import admin
 
 from .models import Ingredient, Recipe, Tag
+from .search import search_recipes
 
 
 @admin.register(Recipe)
 class RecipesAdmin(admin.ModelAdmin):
     """"Админка рецептов."""
-    list_display = ('author', 'name')
+    list_display = ('author', 'name', 'favorites_count')
     search_fields = ('name',)
     list_filter = ('author', 'tags')
     empty_value_display = 'пусто'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search_recipes(queryset, search_term), False
+
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
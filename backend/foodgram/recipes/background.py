@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from django.conf import settings
+from django.db import connections
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_WORKERS,
+            thread_name_prefix='background'
+        )
+    return _executor
+
+
+def close_connections_after(job: Callable, *args) -> None:
+    """Выполнить job в фоновом потоке и закрыть его соединения с БД."""
+    try:
+        job(*args)
+    finally:
+        connections.close_all()
+
+
+def run_in_background(job: Callable, *args) -> None:
+    """
+    Выполнить job(*args) в общем пуле фоновых потоков,
+    либо сразу, если BACKGROUND_WORKERS = 0.
+    """
+    if settings.BACKGROUND_WORKERS:
+        get_executor().submit(close_connections_after, job, *args)
+    else:
+        job(*args)
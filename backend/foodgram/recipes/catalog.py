@@ -0,0 +1,75 @@
+import threading
+from bisect import bisect_left
+
+from django.core.cache import cache
+
+from .models import Ingredient, Tag
+from .versions import INGREDIENT_VERSION_KEY, TAG_VERSION_KEY, table_version
+
+TAG_MAP_KEY = 'tag_map:{0}'
+
+
+def tag_map() -> dict:
+    """Слаги тэгов и их id из кэша текущей версии таблицы тэгов."""
+    return cache.get_or_set(
+        TAG_MAP_KEY.format(table_version(TAG_VERSION_KEY)),
+        lambda: dict(Tag.objects.values_list('slug', 'id')),
+        None
+    )
+
+
+class IngredientCatalog:
+    """
+    Каталог ингредиентов в памяти процесса.
+    Названия хранятся отсортированными в нижнем регистре,
+    поиск по началу названия идёт бинарным поиском.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._keys = []
+        self._rows = []
+
+    def _load(self):
+        version = table_version(INGREDIENT_VERSION_KEY)
+        if version == self._version:
+            return
+        with self._lock:
+            if version == self._version:
+                return
+            rows = sorted(
+                Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit'
+                ),
+                key=lambda row: (row[1].casefold(), row[0])
+            )
+            self._keys = [name.casefold() for _, name, _ in rows]
+            self._rows = rows
+            self._version = version
+
+    @staticmethod
+    def _as_dict(row) -> dict:
+        return {'id': row[0], 'name': row[1], 'measurement_unit': row[2]}
+
+    def all(self) -> list:
+        self._load()
+        return [self._as_dict(row) for row in self._rows]
+
+    def search(self, prefix: str, limit: int) -> list:
+        self._load()
+        keys, rows = self._keys, self._rows
+        prefix = prefix.casefold()
+        result = []
+        index = bisect_left(keys, prefix)
+        while (
+            index < len(keys)
+            and len(result) < limit
+            and keys[index].startswith(prefix)
+        ):
+            result.append(self._as_dict(rows[index]))
+            index += 1
+        return result
+
+
+ingredient_catalog = IngredientCatalog()
@@ -0,0 +1,46 @@
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from users.models import Follow, User
+from .models import Favorite, Recipe
+
+
+def count_subquery(queryset, field: str):
+    """Подзапрос с кол-вом строк queryset для каждой строки по field."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(
+                **{field: OuterRef('pk')}
+            ).order_by().values(field).annotate(
+                count=Count('pk')
+            ).values('count')
+        ),
+        Value(0)
+    )
+
+
+def refresh_favorites_count(recipes=None) -> int:
+    """Пересчитать Recipe.favorites_count."""
+    if recipes is None:
+        recipes = Recipe.objects.all()
+    return recipes.update(
+        favorites_count=count_subquery(Favorite.objects.all(), 'recipe')
+    )
+
+
+def refresh_recipes_count(users=None) -> int:
+    """Пересчитать User.recipes_count."""
+    if users is None:
+        users = User.objects.all()
+    return users.update(
+        recipes_count=count_subquery(Recipe.objects.all(), 'author')
+    )
+
+
+def refresh_followers_count(users=None) -> int:
+    """Пересчитать User.followers_count."""
+    if users is None:
+        users = User.objects.all()
+    return users.update(
+        followers_count=count_subquery(Follow.objects.all(), 'author')
+    )
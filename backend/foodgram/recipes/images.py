@@ -0,0 +1,194 @@
+import base64
+import binascii
+import io
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .background import run_in_background
+from .models import Recipe
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FIELDS = ('image', 'image_card', 'image_thumbnail')
+# Поля рецепта со ссылками на файлы: размеры и исходная картинка.
+MEDIA_FIELDS = IMAGE_FIELDS + ('image_source',)
+
+
+class ImageProcessingError(Exception):
+    """Картинку не удалось разобрать."""
+
+
+def decode_image(data: str) -> bytes:
+    """Раскодировать base64, с префиксом data:image/...;base64, или без."""
+    if data.startswith('data:') and ';base64,' in data:
+        data = data.split(';base64,', 1)[1]
+    try:
+        return base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError) as error:
+        raise ImageProcessingError('Некорректный base64.') from error
+
+
+def check_image(file: File) -> None:
+    """Проверить по заголовку, что файл — картинка, не читая её целиком."""
+    try:
+        with Image.open(file):
+            pass
+    except (OSError, SyntaxError, ValueError) as error:
+        raise ImageProcessingError('Некорректная картинка.') from error
+    finally:
+        file.seek(0)
+
+
+def open_image(raw: bytes) -> Image.Image:
+    """Проверить картинку и развернуть её по EXIF."""
+    try:
+        with Image.open(io.BytesIO(raw)) as image:
+            image.verify()
+        image = Image.open(io.BytesIO(raw))
+        image.load()
+        return ImageOps.exif_transpose(image)
+    except (OSError, SyntaxError, ValueError) as error:
+        raise ImageProcessingError('Некорректная картинка.') from error
+
+
+def render_image(image: Image.Image, max_side: int) -> ContentFile:
+    """Уменьшить картинку до max_side по большей стороне и пересохранить."""
+    image = image.copy()
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    buffer = io.BytesIO()
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image.save(buffer, 'PNG', optimize=True)
+        extension = 'png'
+    else:
+        image.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True)
+        extension = 'jpg'
+    return ContentFile(
+        buffer.getvalue(),
+        name=f'recipe_{max_side}.{extension}'
+    )
+
+
+def process_image(raw: bytes) -> dict:
+    """Все размеры картинки из IMAGE_RENDITIONS: поле рецепта -> файл."""
+    image = open_image(raw)
+    return {
+        field: render_image(image, max_side)
+        for field, max_side in settings.IMAGE_RENDITIONS.items()
+    }
+
+
+def referenced_files(names=None) -> set:
+    """
+    Файлы, на которые ссылаются рецепты: все, либо только из names.
+    """
+    recipes = Recipe.objects.order_by()
+    if names is not None:
+        query = Q()
+        for field in MEDIA_FIELDS:
+            query |= Q(**{f'{field}__in': names})
+        recipes = recipes.filter(query)
+    used = set()
+    for row in recipes.values_list(*MEDIA_FIELDS).iterator():
+        used.update(row)
+    used.discard('')
+    return used
+
+
+def is_stale(name: str, min_age: int) -> bool:
+    """Файл старше min_age секунд."""
+    try:
+        modified = default_storage.get_modified_time(name)
+    except FileNotFoundError:
+        return False
+    return timezone.now() - modified >= timedelta(seconds=min_age)
+
+
+def release_files(names) -> None:
+    """
+    Удалить файлы, на которые больше не ссылается ни один рецепт.
+    Недавно сохранённые не трогаем: это может быть чужой дубликат.
+    """
+    names = {name for name in names if name}
+    if not names:
+        return
+    for name in names - referenced_files(names):
+        if is_stale(name, settings.MEDIA_ORPHAN_MIN_AGE):
+            default_storage.delete(name)
+
+
+def save_renditions(recipe_id: int, raw: bytes, source: str) -> None:
+    """
+    Сохранить размеры картинки, отметить рецепт готовым
+    и освободить прежние файлы, кроме исходной картинки.
+    Если исходную картинку за это время заменили,
+    результат отбрасывается.
+    """
+    names = {
+        field: default_storage.save(content.name, content)
+        for field, content in process_image(raw).items()
+    }
+    old_names = Recipe.objects.filter(pk=recipe_id).values_list(
+        *IMAGE_FIELDS
+    ).first() or ()
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image_source=source
+    ).update(image_status=Recipe.IMAGE_READY, **names)
+    if updated:
+        release_files(set(old_names) - set(names.values()) - {source})
+    else:
+        release_files(set(names.values()) - {source})
+
+
+def process_recipe_image(recipe_id: int) -> None:
+    """
+    Обработать исходную картинку рецепта из хранилища
+    и отметить рецепт готовым.
+    """
+    try:
+        source = Recipe.objects.filter(pk=recipe_id).values_list(
+            'image_source', flat=True
+        ).first()
+        if not source:
+            return
+        with default_storage.open(source, 'rb') as file:
+            save_renditions(recipe_id, file.read(), source)
+    except ImageProcessingError as error:
+        logger.warning('Картинка рецепта %s: %s', recipe_id, error)
+        Recipe.objects.filter(pk=recipe_id).update(
+            image_status=Recipe.IMAGE_FAILED
+        )
+    except Exception:
+        logger.exception('Картинка рецепта %s не обработана.', recipe_id)
+        Recipe.objects.filter(pk=recipe_id).update(
+            image_status=Recipe.IMAGE_FAILED
+        )
+
+
+def schedule_recipe_image(recipe: Recipe, image: File) -> None:
+    """
+    Сохранить исходную картинку в хранилище сразу, в транзакции
+    запроса, а обработать после коммита в фоновом пуле потоков
+    (recipes.background). Если обработка
+    не дошла до конца, рецепт подберёт generate_image_renditions.
+    """
+    old_source = recipe.image_source.name
+    extension = os.path.splitext(image.name or '')[1].lower()
+    source = default_storage.save(f'source{extension}', image)
+    Recipe.objects.filter(pk=recipe.pk).update(image_source=source)
+    recipe.image_source.name = source
+
+    def start():
+        if old_source != source:
+            release_files([old_source])
+        run_in_background(process_recipe_image, recipe.pk)
+
+    transaction.on_commit(start)
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from recipes.images import ImageProcessingError, save_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Создать размеры картинок для рецептов, у которых их нет, '
+        'и повторить зависшую обработку.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать размеры для всех рецептов.'
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=600,
+            help=(
+                'Через сколько секунд картинка в статусе processing '
+                'считается зависшей.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image_source='')
+        if not options['all']:
+            stale = timezone.now() - timedelta(seconds=options['stale_after'])
+            recipes = recipes.filter(
+                Q(image_card='') | Q(image_thumbnail='')
+                | Q(image_status=Recipe.IMAGE_PROCESSING, pub_date__lt=stale)
+            )
+        done = 0
+        # Размеры создаются из сохранённой исходной картинки,
+        # поэтому повторные запуски не ухудшают качество.
+        for recipe in recipes.only('id', 'image_source').iterator():
+            source = recipe.image_source.name
+            try:
+                with default_storage.open(source, 'rb') as file:
+                    save_renditions(recipe.id, file.read(), source)
+            except (OSError, ImageProcessingError) as error:
+                self.stderr.write(f'Рецепт {recipe.id}: {error}')
+                Recipe.objects.filter(pk=recipe.id).update(
+                    image_status=Recipe.IMAGE_FAILED
+                )
+                continue
+            done += 1
+        self.stdout.write(self.style.SUCCESS(f'Обработано рецептов: {done}.'))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import FeedItem, Recipe
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = 'Заново заполнить ленты подписчиков рецептами их авторов.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            FeedItem.objects.all().delete()
+            FeedItem.objects.bulk_create(
+                (
+                    FeedItem(user_id=user_id, recipe_id=recipe_id)
+                    for user_id, recipe_id in Recipe.objects.filter(
+                        author__following__isnull=False
+                    ).values_list(
+                        'author__following__user_id', 'id'
+                    ).order_by().iterator()
+                ),
+                batch_size=BATCH_SIZE
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Записей в лентах: {FeedItem.objects.count()}.'
+            )
+        )
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.recommendations import rebuild_neighbours
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать похожие рецепты по совместному избранному.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--neighbours',
+            type=int,
+            default=settings.RECOMMENDATION_NEIGHBOURS,
+            help='Сколько соседей хранить для каждого рецепта.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            pairs = rebuild_neighbours(options['neighbours'])
+        self.stdout.write(self.style.SUCCESS(f'Записано пар: {pairs}.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import Recipe
+from recipes.search import refresh_search_documents
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать поисковые документы всех рецептов.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            refresh_search_documents(Recipe.objects.all())
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересобрано рецептов: {Recipe.objects.count()}.'
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import (
+    refresh_favorites_count,
+    refresh_followers_count,
+    refresh_recipes_count
+)
+
+
+class Command(BaseCommand):
+    help = 'Пересчитать счётчики избранного, рецептов и подписчиков.'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipes = refresh_favorites_count()
+            users = refresh_recipes_count()
+            refresh_followers_count()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Пересчитано рецептов: {recipes}, '
+                f'пользователей: {users}.'
+            )
+        )
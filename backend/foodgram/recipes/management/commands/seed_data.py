@@ -0,0 +1,164 @@
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.counters import (
+    refresh_favorites_count,
+    refresh_followers_count,
+    refresh_recipes_count
+)
+from recipes.models import (
+    Cart,
+    Favorite,
+    Ingredient,
+    IngredientAmount,
+    Recipe,
+    RecipeTag,
+    Tag
+)
+from recipes.search import refresh_search_documents
+from users.models import Follow, User
+
+BATCH_SIZE = 2000
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполнить базу синтетическими пользователями, рецептами, '
+        'избранным, корзинами и подписками для замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--favorites-per-user', type=int, default=20)
+        parser.add_argument('--carts-per-user', type=int, default=5)
+        parser.add_argument('--follows-per-user', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        if not ingredient_ids or not tag_ids:
+            raise CommandError(
+                'Нет ингредиентов или тэгов, '
+                'сначала выполните loaddata dump.json.'
+            )
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            recipes = self.create_recipes(
+                rng, users, options['recipes'],
+                ingredient_ids, options['ingredients_per_recipe'], tag_ids
+            )
+            self.create_pairs(
+                rng, Favorite, 'user', 'recipe',
+                users, recipes, options['favorites_per_user']
+            )
+            self.create_pairs(
+                rng, Cart, 'user', 'recipe',
+                users, recipes, options['carts_per_user']
+            )
+            self.create_pairs(
+                rng, Follow, 'user', 'author',
+                users, users, options['follows_per_user']
+            )
+            refresh_favorites_count()
+            refresh_recipes_count()
+            refresh_followers_count()
+            refresh_search_documents(Recipe.objects.all())
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Создано пользователей: {len(users)}, '
+                f'рецептов: {len(recipes)}.'
+            )
+        )
+
+    def create_users(self, count):
+        start = User.objects.count()
+        password = make_password(None)
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'seed{number}',
+                    email=f'seed{number}@example.com',
+                    first_name='Seed',
+                    last_name=str(number),
+                    password=password
+                )
+                for number in range(start, start + count)
+            ),
+            batch_size=BATCH_SIZE
+        )
+        return list(
+            User.objects.filter(
+                username__startswith='seed'
+            ).order_by('-id').values_list('id', flat=True)[:count]
+        )
+
+    def create_recipes(self, rng, users, count, ingredient_ids,
+                       ingredients_per_recipe, tag_ids):
+        last_id = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first() or 0
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=rng.choice(users),
+                    name=f'Рецепт {number}',
+                    image='recipes/seed.png',
+                    text=f'Описание рецепта {number}',
+                    cooking_time=rng.randint(1, 180)
+                )
+                for number in range(count)
+            ),
+            batch_size=BATCH_SIZE
+        )
+        recipes = list(
+            Recipe.objects.filter(id__gt=last_id).values_list('id', flat=True)
+        )
+        IngredientAmount.objects.bulk_create(
+            (
+                IngredientAmount(
+                    recipe_id=recipe,
+                    ingredient_id=ingredient,
+                    amount=rng.randint(1, 500)
+                )
+                for recipe in recipes
+                for ingredient in rng.sample(
+                    ingredient_ids,
+                    min(ingredients_per_recipe, len(ingredient_ids))
+                )
+            ),
+            batch_size=BATCH_SIZE
+        )
+        RecipeTag.objects.bulk_create(
+            (
+                RecipeTag(recipe_id=recipe, tag_id=tag)
+                for recipe in recipes
+                for tag in rng.sample(tag_ids, rng.randint(1, len(tag_ids)))
+            ),
+            batch_size=BATCH_SIZE
+        )
+        return recipes
+
+    def create_pairs(self, rng, model, owner_field, target_field,
+                     owners, targets, per_owner):
+        model.objects.bulk_create(
+            (
+                model(**{
+                    f'{owner_field}_id': owner,
+                    f'{target_field}_id': target
+                })
+                for owner in owners
+                for target in rng.sample(
+                    targets, min(per_owner, len(targets))
+                )
+                if owner != target
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True
+        )
@@ -0,0 +1,48 @@
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes.images import is_stale, referenced_files
+
+
+def walk(path=''):
+    """Все файлы хранилища внутри path."""
+    directories, files = default_storage.listdir(path)
+    for name in files:
+        yield os.path.join(path, name)
+    for directory in directories:
+        yield from walk(os.path.join(path, directory))
+
+
+class Command(BaseCommand):
+    help = 'Удалить из медиа файлы, на которые не ссылается ни один рецепт.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=settings.MEDIA_ORPHAN_MIN_AGE,
+            help='Не трогать файлы моложе этого, в секундах.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено.'
+        )
+
+    def handle(self, *args, **options):
+        used = referenced_files()
+        removed = 0
+        for name in walk():
+            if name in used or not is_stale(name, options['min_age']):
+                continue
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                default_storage.delete(name)
+            removed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов без ссылок: {removed}.'
+        ))
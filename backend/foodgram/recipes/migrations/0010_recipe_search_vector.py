@@ -0,0 +1,73 @@
+# Generated by Django 4.2.2 on 2026-10-18 03:45
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+FILL_SEARCH_VECTOR = '''
+UPDATE recipes_recipe r SET search_vector =
+    setweight(to_tsvector(%(config)s, r.name), 'A')
+    || setweight(to_tsvector(%(config)s, COALESCE((
+        SELECT string_agg(i.name, ' ')
+        FROM recipes_ingredientamount a
+        JOIN recipes_ingredient i ON i.id = a.ingredient_id
+        WHERE a.recipe_id = r.id
+    ), '')), 'B')
+    || setweight(to_tsvector(%(config)s, r.text), 'C')
+'''
+
+FILL_FTS = '''
+INSERT INTO recipes_recipe_fts (rowid, name, ingredients, text)
+SELECT r.id, r.name, COALESCE(GROUP_CONCAT(i.name, ' '), ''), r.text
+FROM recipes_recipe r
+LEFT JOIN recipes_ingredientamount a ON a.recipe_id = r.id
+LEFT JOIN recipes_ingredient i ON i.id = a.ingredient_id
+GROUP BY r.id
+'''
+
+
+def create_search_index(apps, schema_editor):
+    """
+    GIN-индекс по search_vector в PostgreSQL,
+    таблица FTS5 в SQLite. Документы заполняются сразу.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            FILL_SEARCH_VECTOR,
+            {'config': settings.RECIPE_SEARCH_CONFIG}
+        )
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS recipe_search_vector_idx '
+            'ON recipes_recipe USING gin (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts '
+            'USING fts5(name, ingredients, text)'
+        )
+        schema_editor.execute(FILL_FTS)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS recipes_recipe_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.2 on 2026-10-18 04:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipeneighbour'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_source',
+            field=models.ImageField(blank=True, editable=False, upload_to='', verbose_name='Исходная картинка'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+from django.db.models import F
+
+
+def fill_image_source(apps, schema_editor):
+    """
+    Для рецептов до image_source исходной считается текущая картинка:
+    размеры создаются из неё, а сама она больше не пересохраняется.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.filter(image_source='').exclude(image='').update(
+        image_source=F('image')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_image_source'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_image_source, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,8 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
 
-from users.models import User
+from users.models import Follow, User
 
 
 class Ingredient(models.Model):
@@ -45,8 +46,66 @@ class Tag(models.Model):
         verbose_name_plural = 'Тэги'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Запросы рецептов."""
+
+    def with_user_flags(self, user):
+        """
+        Флаги избранного, корзины и подписки на автора
+        одним запросом вместо запроса на каждый рецепт.
+        """
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(False),
+                is_in_shopping_cart=models.Value(False),
+                author_is_subscribed=models.Value(False)
+            )
+        return self.annotate(
+            is_favorited=models.Exists(
+                Favorite.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            ),
+            is_in_shopping_cart=models.Exists(
+                Cart.objects.filter(
+                    user=user, recipe=models.OuterRef('pk')
+                )
+            ),
+            author_is_subscribed=models.Exists(
+                Follow.objects.filter(
+                    user=user, author=models.OuterRef('author')
+                )
+            )
+        )
+
+    def for_read(self, user):
+        """Рецепты со всеми данными для ReadRecipeSerializer."""
+        return self.with_user_flags(user).select_related(
+            'author'
+        ).defer(
+            'search_vector'
+        ).prefetch_related(
+            'tags',
+            models.Prefetch(
+                'ingredientamount_set',
+                queryset=IngredientAmount.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
+
+
 class Recipe(models.Model):
     """Модель рецептов."""
+    IMAGE_PROCESSING = 'processing'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = (
+        (IMAGE_PROCESSING, 'Обрабатывается'),
+        (IMAGE_READY, 'Готова'),
+        (IMAGE_FAILED, 'Ошибка'),
+    )
+
     author = models.ForeignKey(
         User,
         verbose_name='Автор',
@@ -60,6 +119,25 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name='Картинка',
     )
+    image_card = models.ImageField(
+        verbose_name='Картинка для карточки',
+        blank=True
+    )
+    image_thumbnail = models.ImageField(
+        verbose_name='Миниатюра',
+        blank=True
+    )
+    image_source = models.ImageField(
+        verbose_name='Исходная картинка',
+        blank=True,
+        editable=False
+    )
+    image_status = models.CharField(
+        verbose_name='Статус картинки',
+        max_length=16,
+        choices=IMAGE_STATUSES,
+        default=IMAGE_READY
+    )
     text = models.TextField(
         verbose_name='Описание',
     )
@@ -83,11 +161,45 @@ class Recipe(models.Model):
         'date_published',
         auto_now=True
     )
+    favorites_count = models.IntegerField(
+        verbose_name='В избранном',
+        default=0,
+        editable=False
+    )
+    # GIN-индекс создаётся миграцией только в PostgreSQL,
+    # в SQLite вместо поля используется таблица FTS5.
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx'
+            ),
+            # Поиск рецептов, ссылающихся на файл, при его освобождении.
+            models.Index(fields=['image'], name='recipe_image_idx'),
+            models.Index(fields=['image_card'], name='recipe_image_card_idx'),
+            models.Index(
+                fields=['image_thumbnail'],
+                name='recipe_image_thumbnail_idx'
+            ),
+            models.Index(
+                fields=['image_source'],
+                name='recipe_image_source_idx'
+            )
+        ]
 
 
 class RecipeTag(models.Model):
@@ -103,6 +215,12 @@ class RecipeTag(models.Model):
                 fields=['recipe', 'tag'],
                 name='unique_recipe_tag')
         ]
+        indexes = [
+            models.Index(
+                fields=['tag', 'recipe'],
+                name='recipetag_tag_recipe_idx'
+            )
+        ]
 
 
 class IngredientAmount(models.Model):
@@ -131,6 +249,12 @@ class IngredientAmount(models.Model):
                 fields=['recipe', 'ingredient'],
                 name='unique_recipe_ingredient')
         ]
+        indexes = [
+            models.Index(
+                fields=['ingredient', 'recipe'],
+                name='amount_ingredient_recipe_idx'
+            )
+        ]
 
 
 class Favorite(models.Model):
@@ -153,6 +277,12 @@ class Favorite(models.Model):
                 fields=['user', 'recipe'],
                 name='unique_favorite_recipe')
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='favorite_recipe_user_idx'
+            )
+        ]
 
 
 class Cart(models.Model):
@@ -175,3 +305,72 @@ class Cart(models.Model):
                 fields=['user', 'recipe'],
                 name='unique_recipe_in_cart')
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='cart_recipe_user_idx'
+            )
+        ]
+
+
+class FeedItem(models.Model):
+    """Рецепт в ленте подписчика, заполняется при публикации."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_items'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_items'
+    )
+
+    class Meta:
+        verbose_name = ('Лента')
+        verbose_name_plural = ('Ленты')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_item')
+        ]
+
+
+class RecipeNeighbour(models.Model):
+    """
+    Похожий рецепт: его добавляют в избранное вместе с recipe.
+    Хранятся лучшие соседи каждого рецепта по score.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='neighbours'
+    )
+    neighbour = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='neighbour_of'
+    )
+    together = models.PositiveIntegerField(
+        verbose_name='В избранном вместе',
+        default=0
+    )
+    score = models.FloatField(
+        verbose_name='Сходство',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = ('Похожий рецепт')
+        verbose_name_plural = ('Похожие рецепты')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'neighbour'],
+                name='unique_recipe_neighbour')
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='neighbour_recipe_score_idx'
+            )
+        ]
@@ -0,0 +1,194 @@
+import heapq
+import logging
+import math
+from itertools import groupby
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Count,
+    F,
+    FloatField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value
+)
+from django.db.models.functions import Cast, Greatest, Sqrt
+
+from .background import run_in_background
+from .models import Favorite, Recipe, RecipeNeighbour
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 2000
+# Сколько последних избранных пользователя учитывать
+# при добавлении нового, чтобы запрос оставался быстрым.
+RECENT_FAVORITES_LIMIT = 200
+
+
+def similarity(together: int, first: int, second: int) -> float:
+    """Косинусная мера: совместные добавления к числу добавлений."""
+    return together / math.sqrt(max(first * second, 1))
+
+
+def co_occurrence():
+    """
+    Пары рецептов, которые есть в избранном у одних и тех же
+    пользователей, и число таких пользователей. Считается базой
+    одним запросом с группировкой, по порядку recipe_id.
+    """
+    return Favorite.objects.annotate(
+        neighbour_id=F('user__favorite_by__recipe_id')
+    ).exclude(
+        neighbour_id=F('recipe_id')
+    ).values('recipe_id', 'neighbour_id').annotate(
+        together=Count('id')
+    ).order_by('recipe_id').values_list(
+        'recipe_id', 'neighbour_id', 'together'
+    )
+
+
+def rebuild_neighbours(limit: int = None) -> int:
+    """
+    Пересчитать соседей всех рецептов, оставив limit лучших.
+    Вернёт кол-во записанных пар.
+    """
+    limit = limit or settings.RECOMMENDATION_NEIGHBOURS
+    favorites = dict(
+        Favorite.objects.values('recipe_id').annotate(
+            total=Count('id')
+        ).order_by().values_list('recipe_id', 'total')
+    )
+
+    def best_neighbours():
+        for recipe_id, rows in groupby(
+            co_occurrence().iterator(), key=lambda row: row[0]
+        ):
+            for _, neighbour_id, together, score in heapq.nlargest(
+                limit,
+                (
+                    row + (similarity(
+                        row[2], favorites[recipe_id], favorites[row[1]]
+                    ),)
+                    for row in rows
+                ),
+                key=lambda row: row[3]
+            ):
+                yield RecipeNeighbour(
+                    recipe_id=recipe_id,
+                    neighbour_id=neighbour_id,
+                    together=together,
+                    score=score
+                )
+
+    RecipeNeighbour.objects.all().delete()
+    return len(RecipeNeighbour.objects.bulk_create(
+        best_neighbours(),
+        batch_size=BATCH_SIZE
+    ))
+
+
+def favorites_count_of(field: str) -> Subquery:
+    return Subquery(
+        Recipe.objects.filter(pk=OuterRef(field)).values('favorites_count')
+    )
+
+
+def record_favorites(user_id: int, recipe_ids) -> None:
+    """
+    Учесть новые избранные пользователя: каждая пара нового рецепта
+    с другими его избранными получает ещё одно совпадение,
+    и сходство этих пар пересчитывается. Лишние пары сверх лучших
+    убирает rebuild_neighbours.
+    """
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return
+    others = set(
+        Favorite.objects.filter(user_id=user_id).exclude(
+            recipe_id__in=recipe_ids
+        ).order_by('-id').values_list('recipe_id', flat=True)[
+            :RECENT_FAVORITES_LIMIT
+        ]
+    )
+    if not others and len(recipe_ids) < 2:
+        return
+    new_pairs = set()
+    for recipe_id in recipe_ids:
+        for other_id in others | recipe_ids - {recipe_id}:
+            new_pairs.add((recipe_id, other_id))
+            new_pairs.add((other_id, recipe_id))
+    pairs = (
+        Q(recipe_id__in=recipe_ids, neighbour_id__in=others | recipe_ids)
+        | Q(recipe_id__in=others, neighbour_id__in=recipe_ids)
+    )
+    with transaction.atomic():
+        RecipeNeighbour.objects.bulk_create(
+            (
+                RecipeNeighbour(recipe_id=recipe_id, neighbour_id=other_id)
+                for recipe_id, other_id in new_pairs
+            ),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True
+        )
+        # Справа в UPDATE значения до изменения, поэтому together + 1.
+        RecipeNeighbour.objects.filter(pairs).update(
+            together=F('together') + 1,
+            score=Cast(F('together') + 1, FloatField()) / Sqrt(
+                Cast(
+                    Greatest(
+                        favorites_count_of('recipe_id')
+                        * favorites_count_of('neighbour_id'),
+                        Value(1)
+                    ),
+                    FloatField()
+                )
+            )
+        )
+
+
+def run_record_favorites(user_id: int, recipe_ids) -> None:
+    try:
+        record_favorites(user_id, recipe_ids)
+    except Exception:
+        logger.exception(
+            'Соседи рецептов %s не обновлены.', sorted(recipe_ids)
+        )
+
+
+def schedule_record_favorites(user_id: int, recipe_ids) -> None:
+    """
+    Обновить соседей после коммита в фоновом пуле потоков
+    (recipes.background).
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    transaction.on_commit(
+        lambda: run_in_background(run_record_favorites, user_id, recipe_ids)
+    )
+
+
+def similar_recipes(recipe_id: int):
+    """Соседи рецепта, лучшие первыми: один запрос по индексу."""
+    return Recipe.objects.filter(
+        neighbour_of__recipe_id=recipe_id
+    ).order_by('-neighbour_of__score')
+
+
+def recommended_recipes(user):
+    """
+    Соседи избранных рецептов пользователя, которых у него
+    в избранном ещё нет, по сумме сходства.
+    """
+    return Recipe.objects.filter(
+        neighbour_of__recipe_id__in=Favorite.objects.filter(
+            user=user
+        ).values('recipe_id')
+    ).exclude(
+        favorite_is__user=user
+    ).annotate(
+        recommendation_score=Sum('neighbour_of__score')
+    ).order_by('-recommendation_score', '-id')
@@ -0,0 +1,135 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector
+)
+from django.db import connection
+from django.db.models import F, OuterRef, Subquery, TextField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+
+from .models import Ingredient, IngredientAmount, Recipe
+
+FTS_TABLE = 'recipes_recipe_fts'
+SQLITE_BATCH_SIZE = 500
+
+
+def ingredient_names() -> Subquery:
+    """Названия ингредиентов рецепта одной строкой."""
+    return Subquery(
+        IngredientAmount.objects.filter(
+            recipe=OuterRef('pk')
+        ).values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names'),
+        output_field=TextField()
+    )
+
+
+def search_vector() -> SearchVector:
+    """
+    Поисковый документ рецепта: название важнее ингредиентов,
+    ингредиенты важнее описания.
+    """
+    config = settings.RECIPE_SEARCH_CONFIG
+    return (
+        SearchVector('name', weight='A', config=config)
+        + SearchVector(
+            Coalesce(
+                ingredient_names(), Value(''), output_field=TextField()
+            ),
+            weight='B',
+            config=config
+        )
+        + SearchVector('text', weight='C', config=config)
+    )
+
+
+def refresh_search_documents(recipes) -> None:
+    """
+    Пересобрать поисковые документы рецептов из queryset recipes.
+    В PostgreSQL это поле search_vector, в SQLite — таблица FTS5.
+    """
+    if connection.vendor == 'postgresql':
+        recipes.update(search_vector=search_vector())
+    elif connection.vendor == 'sqlite':
+        ids = list(recipes.values_list('id', flat=True))
+        for start in range(0, len(ids), SQLITE_BATCH_SIZE):
+            refresh_fts(ids[start:start + SQLITE_BATCH_SIZE])
+
+
+def refresh_fts(ids: list) -> None:
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            ids
+        )
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, ingredients, text) '
+            f'SELECT r.id, r.name, '
+            f"COALESCE(GROUP_CONCAT(i.name, ' '), ''), r.text "
+            f'FROM {Recipe._meta.db_table} r '
+            f'LEFT JOIN {IngredientAmount._meta.db_table} a '
+            f'ON a.recipe_id = r.id '
+            f'LEFT JOIN {Ingredient._meta.db_table} i '
+            f'ON i.id = a.ingredient_id '
+            f'WHERE r.id IN ({placeholders}) GROUP BY r.id',
+            ids
+        )
+
+
+def remove_search_documents(ids: list) -> None:
+    """Удалить документы рецептов из FTS5, в PostgreSQL ничего не нужно."""
+    if connection.vendor != 'sqlite' or not ids:
+        return
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})',
+            ids
+        )
+
+
+def fts_query(query: str) -> str:
+    """Запрос FTS5: все слова запроса, каждое как начало слова."""
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def search_recipes(queryset, query: str):
+    """
+    Отобрать рецепты по запросу и отсортировать по релевантности.
+    На других базах — поиск по вхождению в название.
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            query,
+            search_type='websearch',
+            config=settings.RECIPE_SEARCH_CONFIG
+        )
+        return queryset.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(F('search_vector'), search_query)
+        ).order_by('-search_rank', '-pub_date', '-id')
+    if connection.vendor == 'sqlite':
+        match = fts_query(query)
+        if not match:
+            return queryset.none()
+        return queryset.filter(
+            id__in=RawSQL(
+                f'SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s',
+                (match,)
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({FTS_TABLE}, 10.0, 5.0, 1.0) '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'AND rowid = {Recipe._meta.db_table}.id',
+                (match,)
+            )
+        ).order_by('-search_rank', '-pub_date', '-id')
+    return queryset.filter(name__icontains=query)
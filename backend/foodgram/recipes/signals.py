@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Ingredient, Recipe, Tag
+from .search import refresh_search_documents, remove_search_documents
+from .versions import (
+    INGREDIENT_VERSION_KEY,
+    TAG_VERSION_KEY,
+    bump_table_version
+)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    """Сбросить каталог и кэш ингредиентов при изменении."""
+    bump_table_version(INGREDIENT_VERSION_KEY)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_renamed(sender, instance, created, raw=False, **kwargs):
+    """Пересобрать поисковые документы рецептов с этим ингредиентом."""
+    if created or raw:
+        return
+    transaction.on_commit(
+        lambda: refresh_search_documents(
+            Recipe.objects.filter(ingredients=instance)
+        )
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, raw=False, **kwargs):
+    """
+    Пересобрать поисковый документ рецепта после коммита,
+    когда ингредиенты уже сохранены.
+    """
+    if raw:
+        return
+    transaction.on_commit(
+        lambda: refresh_search_documents(
+            Recipe.objects.filter(pk=instance.pk)
+        )
+    )
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """Убрать документ удалённого рецепта из FTS5."""
+    remove_search_documents([instance.pk])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    """Сбросить кэш тэгов при изменении."""
+    bump_table_version(TAG_VERSION_KEY)
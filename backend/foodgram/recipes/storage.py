@@ -0,0 +1,58 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, где имя файла — sha256 его содержимого.
+    Одинаковые файлы хранятся один раз, повторная загрузка
+    только обновляет время изменения существующего. Файл пишется
+    во временный и ссылкой появляется под итоговым именем целиком.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(
+            os.path.dirname(name), digest[:2], f'{digest}{extension}'
+        )
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяет содержимое: занятое имя — тот же файл.
+        return name
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            os.utime(full_path)
+            return name
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=directory, prefix='.tmp-', delete=False
+        ) as file:
+            for chunk in content.chunks():
+                file.write(
+                    chunk if isinstance(chunk, bytes) else chunk.encode()
+                )
+        try:
+            if self.file_permissions_mode is not None:
+                os.chmod(file.name, self.file_permissions_mode)
+            os.link(file.name, full_path)
+        except FileExistsError:
+            # Тот же файл одновременно сохранил другой поток.
+            os.utime(full_path)
+        finally:
+            os.remove(file.name)
+        return name
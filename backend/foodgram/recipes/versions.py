@@ -0,0 +1,19 @@
+import time
+
+from django.core.cache import cache
+
+INGREDIENT_VERSION_KEY = 'ingredient_version'
+TAG_VERSION_KEY = 'tag_version'
+
+
+def table_version(key: str) -> int:
+    """
+    Общая для всех воркеров версия таблицы.
+    Это время последнего изменения в наносекундах.
+    """
+    return cache.get_or_set(key, time.time_ns, None)
+
+
+def bump_table_version(key: str) -> None:
+    """Отметить изменение таблицы."""
+    cache.set(key, time.time_ns(), None)
@@ -6,7 +6,10 @@ from .models import User
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     """"Админка пользователей."""
-    list_display = ('username', 'email', 'first_name')
+    list_display = (
+        'username', 'email', 'first_name',
+        'recipes_count', 'followers_count'
+    )
     search_fields = ('username',)
     list_filter = ('username',)
     empty_value_display = '-пусто-'
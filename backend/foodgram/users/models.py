@@ -17,6 +17,16 @@ class User(AbstractUser):
         verbose_name='Имя',
         max_length=150
     )
+    recipes_count = models.IntegerField(
+        verbose_name='Кол-во рецептов',
+        default=0,
+        editable=False
+    )
+    followers_count = models.IntegerField(
+        verbose_name='Кол-во подписчиков',
+        default=0,
+        editable=False
+    )
 
     class Meta:
         verbose_name = ('Пользователь')
@@ -45,3 +55,9 @@ class Follow(models.Model):
                 fields=['user', 'author'],
                 name='unique_follow')
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            )
+        ]